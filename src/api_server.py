@@ -4,27 +4,99 @@ Local API server for testing RunPod serverless worker.
 This provides FastAPI endpoints that forward requests to ComfyUI.
 """
 
+import asyncio
+import httpx
+import logging
 import uvicorn
+import websockets
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.openapi.utils import get_openapi
-from fastapi.responses import JSONResponse, PlainTextResponse
-import requests
-import json
-import os
-import traceback
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from pydantic import BaseModel, ConfigDict, ValidationError
+import orjson
+import secrets
 import sys
-import threading
 import time
-import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from enum import Enum
 from pathlib import Path
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import AsyncIterator, Dict, Any, List, Mapping, Optional, Set, Tuple
 
 import yaml
 
+from config import API_SERVER_WORKERS, LOG_LEVEL
 from workflows import resolve_image_style_prompt
 
-app = FastAPI(title='RunPod Serverless Worker API')
+logger = logging.getLogger(__name__)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, skipping FastAPI's ``jsonable_encoder`` pass."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+COMFY_API_BASE = "http://127.0.0.1:8188"
+COMFY_WS_URL = "ws://127.0.0.1:8188/ws"
+# One websocket client ID per server process; ComfyUI broadcasts prompt events to it
+WS_CLIENT_ID = secrets.token_hex(16)
+COMFY_WS_CLIENT_URL = f"{COMFY_WS_URL}?clientId={WS_CLIENT_ID}"
+JSON_HEADERS = {"content-type": "application/json"}
+
+# ComfyUI endpoints, relative to the shared client's base_url
+COMFY_PROMPT_PATH = "/prompt"
+COMFY_HISTORY_PATH = "/history"
+COMFY_STATS_PATH = "/system_stats"
+
+# Canned response bodies; job ids are hex, so they can be spliced in without escaping
+QUEUED_BODY_PREFIX, QUEUED_BODY_SUFFIX = orjson.dumps({"id": "JOB_ID", "status": "QUEUED"}).split(b"JOB_ID")
+HEALTHY_BODY = orjson.dumps({"status": "healthy", "comfyui": "connected"})
+
+# Keep-alive pool sized for concurrent submissions, history lookups and health probes
+COMFY_HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+
+# Shared async HTTP client for ComfyUI, owned by the application lifespan
+comfy_http: Optional[httpx.AsyncClient] = None
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Own the pooled ComfyUI HTTP client and the shared websocket and history consumers."""
+
+    global comfy_http
+    load_all_templates()
+    comfy_http = httpx.AsyncClient(base_url=COMFY_API_BASE, timeout=30, limits=COMFY_HTTP_LIMITS)
+    background_tasks = [
+        asyncio.create_task(ws_multiplexer()),
+        asyncio.create_task(history_poller()),
+    ]
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await comfy_http.aclose()
+        comfy_http = None
+
+
+def get_comfy_http() -> httpx.AsyncClient:
+    """Return the shared ComfyUI HTTP client, failing loudly outside the app lifespan."""
+
+    if comfy_http is None:
+        raise RuntimeError("ComfyUI HTTP client is not initialized")
+    return comfy_http
+
+
+app = FastAPI(
+    title='RunPod Serverless Worker API',
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 OPENAPI_SPEC_PATH = Path(__file__).resolve().parent.parent / "docs" / "openapi.yaml"
 
@@ -59,8 +131,6 @@ def custom_openapi() -> Dict[str, Any]:
 
 app.openapi = custom_openapi
 
-COMFY_API_BASE = "http://127.0.0.1:8188"
-
 WORKFLOW_TEMPLATES_DOC_PATH = Path(__file__).resolve().parent.parent / "docs" / "workflow-templates.md"
 
 WORKFLOW_TEMPLATES: Dict[str, str] = {
@@ -76,20 +146,81 @@ WORKFLOW_TEMPLATES: Dict[str, str] = {
 }
 
 
-def load_workflow_template(workflow_name: str) -> Dict[str, Any]:
-    """Load workflow template from local workflows directory."""
-    template_file = WORKFLOW_TEMPLATES.get(workflow_name)
-    if not template_file:
-        raise ValueError(f"Unknown workflow '{workflow_name}'")
+# Parsed template and pre-encoded /prompt body per workflow name, filled once at startup
+workflow_template_cache: Mapping[str, Tuple[Dict[str, Any], bytes]] = MappingProxyType({})
+
+
+def load_all_templates() -> None:
+    """Read, parse and encode every known workflow template, failing fast on a bad file."""
 
-    template_path = os.path.join(os.path.dirname(__file__), "..", "workflows", template_file)
+    global workflow_template_cache
+    workflows_dir = Path(__file__).resolve().parent.parent / "workflows"
+    loaded: Dict[str, Tuple[Dict[str, Any], bytes]] = {}
+    for workflow_name, template_file in WORKFLOW_TEMPLATES.items():
+        template_path = workflows_dir / template_file
+        try:
+            workflow = orjson.loads(template_path.read_bytes())
+        except FileNotFoundError as exc:
+            raise ValueError(f"Workflow template not found at {template_path}") from exc
+        except orjson.JSONDecodeError as exc:
+            raise ValueError(f"Invalid JSON in workflow template {template_file}: {exc}") from exc
+        loaded[workflow_name] = (workflow, orjson.dumps({"prompt": workflow}))
+    workflow_template_cache = MappingProxyType(loaded)
+
+
+def _cached_template(workflow_name: str) -> Tuple[Dict[str, Any], bytes]:
     try:
-        with open(template_path, "r", encoding="utf-8") as workflow_file:
-            return json.load(workflow_file)
-    except FileNotFoundError as exc:
-        raise ValueError(f"Workflow template not found at {template_path}") from exc
-    except json.JSONDecodeError as exc:
-        raise ValueError(f"Invalid JSON in workflow template: {exc}") from exc
+        return workflow_template_cache[workflow_name]
+    except KeyError:
+        raise ValueError(f"Unknown workflow '{workflow_name}'") from None
+
+
+def load_workflow_template(workflow_name: str) -> Dict[str, Any]:
+    """Return the parsed workflow template loaded at startup.
+
+    The returned dict is shared between requests and must be treated as read-only.
+    """
+    return _cached_template(workflow_name)[0]
+
+
+def load_prompt_payload(workflow_name: str) -> bytes:
+    """Return the pre-encoded ``{"prompt": workflow}`` body ComfyUI expects for a template."""
+    return _cached_template(workflow_name)[1]
+
+
+def _log_preview(message: str, payload: Any, limit: int = 200) -> None:
+    """Log the first ``limit`` characters of a payload, serializing it only when DEBUG is enabled."""
+
+    if logger.isEnabledFor(logging.DEBUG):
+        serialized = orjson.dumps(payload, default=lambda obj: obj.model_dump())
+        logger.debug("%s: %s...", message, serialized[:limit].decode("utf-8", "replace"))
+
+
+class JobInput(BaseModel):
+    """The ``input`` object of a /run or /runsync request; unknown keys are passed through."""
+
+    model_config = ConfigDict(extra='allow')
+
+    comfyui_workflow_name: str = 'video_wan2_2_14B_i2v'
+    image_style: Optional[str] = None
+
+
+class RunRequest(BaseModel):
+    """Request body accepted by /run and /runsync."""
+
+    input: JobInput
+
+
+def _validation_detail(exc: ValidationError) -> str:
+    """Flatten pydantic validation errors into a short client-facing message."""
+    errors = exc.errors(include_url=False, include_input=False)
+    if errors and errors[0]['type'] == 'json_invalid':
+        return errors[0]['msg']
+    return "; ".join(
+        f"'{'.'.join(str(part) for part in error['loc']) or 'body'}': {error['msg']}"
+        for error in errors
+    )
+
 
 class JobStatus(Enum):
     QUEUED = "queued"
@@ -97,9 +228,125 @@ class JobStatus(Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
-# In-memory storage for job status (in production, use Redis or database)
-job_status_store: Dict[str, Dict[str, Any]] = {}
-job_results: Dict[str, Dict[str, Any]] = {}
+# In-memory storage for job status (in production, use Redis or database).
+# Bounded TTL caches so finished jobs are evicted instead of accumulating forever.
+# Only the event loop thread touches them, so no additional locking is needed.
+JOB_STORE_MAX_ENTRIES = 10_000
+JOB_STORE_TTL_S = 3600
+job_status_store: "TTLCache[str, Dict[str, Any]]" = TTLCache(maxsize=JOB_STORE_MAX_ENTRIES, ttl=JOB_STORE_TTL_S)
+job_results: "TTLCache[str, Dict[str, Any]]" = TTLCache(maxsize=JOB_STORE_MAX_ENTRIES, ttl=JOB_STORE_TTL_S)
+
+# Strong references to running monitor tasks so they are not garbage collected
+monitor_tasks: Set["asyncio.Task[None]"] = set()
+
+# Prompts awaiting completion, resolved by the shared websocket consumer
+pending_prompts: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+# Terminal websocket events seen before their prompt was registered
+unclaimed_prompt_events: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+UNCLAIMED_EVENTS_MAX = 256
+
+MONITOR_TIMEOUT_S = 300.0
+MONITOR_INITIAL_DELAY_S = 1.0
+MONITOR_MAX_DELAY_S = 8.0
+HISTORY_POLL_INTERVAL_S = 2.0
+# Pending prompts finished recently, so the newest entries are enough to find them
+HISTORY_POLL_MAX_ITEMS = 256
+
+
+async def _submit(request: Request, endpoint: str) -> str:
+    """
+    Validate a /run or /runsync request body, submit its workflow to ComfyUI,
+    and return the queued prompt_id. Raises HTTPException for client and ComfyUI errors.
+    """
+    # Parse and validate the request body in one pass
+    try:
+        body = RunRequest.model_validate_json(await request.body())
+    except ValidationError as exc:
+        detail = _validation_detail(exc)
+        print(f"ERROR: Invalid {endpoint} request body: {detail}", file=sys.stderr)
+        raise HTTPException(status_code=400, detail=detail)
+
+    _log_preview(f"Received {endpoint} request", body)
+
+    workflow_name = body.input.comfyui_workflow_name
+    image_style = body.input.image_style
+    try:
+        workflow = load_workflow_template(workflow_name)
+        prompt_payload = load_prompt_payload(workflow_name)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if image_style is not None:
+        try:
+            style_prompt = resolve_image_style_prompt(image_style)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+        def _replace(value: Any) -> Any:
+            if isinstance(value, dict):
+                return {key: _replace(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [_replace(item) for item in value]
+            if value == "{{ IMAGE_STYLE_PROMPT }}":
+                return style_prompt
+            return value
+
+        workflow = _replace(workflow)
+        prompt_payload = orjson.dumps({"prompt": workflow})
+    
+    print(f"Submitting workflow '{workflow_name}' to ComfyUI ({endpoint})")
+    _log_preview(f"Workflow '{workflow_name}'", workflow)
+    
+    # Forward to ComfyUI - payload is the workflow wrapped in 'prompt' as ComfyUI expects
+    response = await get_comfy_http().post(COMFY_PROMPT_PATH, content=prompt_payload, headers=JSON_HEADERS)
+    
+    print(f"ComfyUI response status ({endpoint}): {response.status_code}")
+    
+    if response.status_code == 400:
+        # ComfyUI returned 400 - this is a client error (bad workflow)
+        print(f"ComfyUI returned 400 Bad Request ({endpoint})", file=sys.stderr)
+        print(f"Response body: {response.text[:500]}", file=sys.stderr)
+        try:
+            error_body = orjson.loads(response.content)
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail=f"ComfyUI validation error: {response.text[:500]}"
+            )
+        raise HTTPException(
+            status_code=400,
+            detail=f"ComfyUI validation error: {orjson.dumps(error_body).decode()}"
+        )
+
+    if response.status_code != 200:
+        # Other non-200 status codes are gateway/server errors
+        print(f"ERROR: ComfyUI returned non-200 status: {response.status_code}", file=sys.stderr)
+        print(f"Response body: {response.text[:500]}", file=sys.stderr)
+        raise HTTPException(
+            status_code=502, 
+            detail=f"ComfyUI error (HTTP {response.status_code}): {response.text[:500]}"
+        )
+
+    try:
+        result = orjson.loads(response.content)
+        _log_preview(f"ComfyUI response ({endpoint})", result)
+    except Exception as e:
+        print(f"ERROR: Failed to parse ComfyUI JSON response: {e}", file=sys.stderr)
+        raise HTTPException(
+            status_code=502, 
+            detail=f"Invalid JSON from ComfyUI: {response.text[:500]}"
+        )
+    
+    # Check for errors in ComfyUI response
+    if 'error' in result:
+        error_detail = result.get('error')
+        print(f"ComfyUI returned error: {error_detail}", file=sys.stderr)
+        raise HTTPException(
+            status_code=400, 
+            detail=f"ComfyUI error: {orjson.dumps(error_detail).decode()}"
+        )
+
+    return result.get('prompt_id')
 
 
 @app.post('/run')
@@ -112,125 +359,34 @@ async def run_endpoint(request: Request):
     - GET /docs/workflow-templates
     """
     try:
-        # Parse request body
-        try:
-            body = await request.json()
-        except Exception as e:
-            print(f"ERROR: Failed to parse JSON body: {e}", file=sys.stderr)
-            raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
+        prompt_id = await _submit(request, '/run')
+        future = register_prompt(prompt_id)
         
-        print(f"Received /run request: {json.dumps(body)[:200]}...")
+        # Generate a job ID for tracking
+        job_id = secrets.token_hex(16)
         
-        # Validate input shape
-        if not isinstance(body, dict) or 'input' not in body:
-            raise HTTPException(status_code=400, detail="'input' is required in request body")
-        
-        job_input = body.get('input')
-        if not isinstance(job_input, dict):
-            raise HTTPException(status_code=400, detail="'input' must be an object")
-
-        workflow_name = job_input.get('comfyui_workflow_name', 'video_wan2_2_14B_i2v')
-        image_style = job_input.get('image_style')
-        try:
-            workflow = load_workflow_template(workflow_name)
-        except ValueError as exc:
-            raise HTTPException(status_code=400, detail=str(exc))
-
-        if image_style is not None:
-            try:
-                style_prompt = resolve_image_style_prompt(image_style)
-            except ValueError as exc:
-                raise HTTPException(status_code=400, detail=str(exc))
-
-            def _replace(value: Any) -> Any:
-                if isinstance(value, dict):
-                    return {key: _replace(item) for key, item in value.items()}
-                if isinstance(value, list):
-                    return [_replace(item) for item in value]
-                if value == "{{ IMAGE_STYLE_PROMPT }}":
-                    return style_prompt
-                return value
-
-            workflow = _replace(workflow)
-        
-        print(f"Submitting workflow '{workflow_name}' to ComfyUI: {json.dumps(workflow)[:200]}...")
-        
-        # Forward to ComfyUI - wrap workflow in 'prompt' key as ComfyUI expects
-        comfy_payload = {"prompt": workflow}
-        comfy_url = f'{COMFY_API_BASE}/prompt'
-        response = requests.post(comfy_url, json=comfy_payload, timeout=30)
+        # Store initial job status
+        job_status_store[job_id] = {
+            "status": JobStatus.QUEUED.value,
+            "prompt_id": prompt_id,
+            "created_at": time.time(),
+            "updated_at": time.time()
+        }
         
-        print(f"ComfyUI response status: {response.status_code}")
+        # Start background monitoring on the event loop
+        monitor_task = asyncio.create_task(monitor_job(job_id, prompt_id, future))
+        monitor_tasks.add(monitor_task)
+        monitor_task.add_done_callback(monitor_tasks.discard)
         
-        if response.status_code == 200:
-            try:
-                result = response.json()
-                print(f"ComfyUI response: {json.dumps(result)[:200]}...")
-            except Exception as e:
-                print(f"ERROR: Failed to parse ComfyUI JSON response: {e}", file=sys.stderr)
-                raise HTTPException(
-                    status_code=502, 
-                    detail=f"Invalid JSON from ComfyUI: {response.text[:500]}"
-                )
-            
-            # Check for errors in ComfyUI response
-            if 'error' in result:
-                error_detail = result.get('error')
-                print(f"ComfyUI returned error: {error_detail}", file=sys.stderr)
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"ComfyUI error: {json.dumps(error_detail)}"
-                )
-            
-            prompt_id = result.get('prompt_id')
-            
-            # Generate a job ID for tracking
-            job_id = str(uuid.uuid4())
-            
-            # Store initial job status
-            job_status_store[job_id] = {
-                "status": JobStatus.QUEUED.value,
-                "prompt_id": prompt_id,
-                "created_at": time.time(),
-                "updated_at": time.time()
-            }
-            
-            # Start background monitoring
-            monitor_thread = threading.Thread(target=monitor_job, args=(job_id, prompt_id))
-            monitor_thread.daemon = True
-            monitor_thread.start()
-            
-            return {'id': job_id, 'status': 'QUEUED'}
-        elif response.status_code == 400:
-            # ComfyUI returned 400 - this is a client error (bad workflow)
-            print(f"ComfyUI returned 400 Bad Request", file=sys.stderr)
-            print(f"Response body: {response.text[:500]}", file=sys.stderr)
-            try:
-                error_body = response.json()
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"ComfyUI validation error: {json.dumps(error_body)}"
-                )
-            except ValueError:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"ComfyUI validation error: {response.text[:500]}"
-                )
-        else:
-            # Other non-200 status codes are gateway/server errors
-            print(f"ERROR: ComfyUI returned non-200 status: {response.status_code}", file=sys.stderr)
-            print(f"Response body: {response.text[:500]}", file=sys.stderr)
-            raise HTTPException(
-                status_code=502, 
-                detail=f"ComfyUI error (HTTP {response.status_code}): {response.text[:500]}"
-            )
+        return Response(
+            content=QUEUED_BODY_PREFIX + job_id.encode() + QUEUED_BODY_SUFFIX,
+            media_type="application/json",
+        )
     
     except HTTPException:
         raise
     except Exception as e:
-        error_trace = traceback.format_exc()
-        print(f"ERROR: Unhandled exception in /run endpoint:", file=sys.stderr)
-        print(error_trace, file=sys.stderr)
+        logger.exception("Unhandled exception in /run endpoint")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
 
@@ -254,182 +410,262 @@ async def runsync_endpoint(request: Request):
     Accepts a workflow, submits it to ComfyUI, and waits for completion.
     """
     try:
-        # Parse request body
-        try:
-            body = await request.json()
-        except Exception as e:
-            print(f"ERROR: Failed to parse JSON body: {e}", file=sys.stderr)
-            raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
-        
-        print(f"Received /runsync request: {json.dumps(body)[:200]}...")
-        
-        # Validate input shape
-        if not isinstance(body, dict) or 'input' not in body:
-            raise HTTPException(status_code=400, detail="'input' is required in request body")
-        
-        job_input = body.get('input')
-        if not isinstance(job_input, dict):
-            raise HTTPException(status_code=400, detail="'input' must be an object")
-
-        workflow_name = job_input.get('comfyui_workflow_name', 'video_wan2_2_14B_i2v')
-        try:
-            workflow = load_workflow_template(workflow_name)
-        except ValueError as exc:
-            raise HTTPException(status_code=400, detail=str(exc))
-
-        print(f"Submitting workflow '{workflow_name}' to ComfyUI (sync): {json.dumps(workflow)[:200]}...")
-        
-        # Forward to ComfyUI - wrap workflow in 'prompt' key as ComfyUI expects
-        comfy_payload = {"prompt": workflow}
-        comfy_url = f'{COMFY_API_BASE}/prompt'
-        response = requests.post(comfy_url, json=comfy_payload, timeout=30)
-        
-        print(f"ComfyUI response status (sync): {response.status_code}")
-        
-        if response.status_code == 200:
-            try:
-                result = response.json()
-                print(f"ComfyUI response (sync): {json.dumps(result)[:200]}...")
-            except Exception as e:
-                print(f"ERROR: Failed to parse ComfyUI JSON response: {e}", file=sys.stderr)
-                raise HTTPException(
-                    status_code=502, 
-                    detail=f"Invalid JSON from ComfyUI: {response.text[:500]}"
-                )
-            
-            # Check for errors in ComfyUI response
-            if 'error' in result:
-                error_detail = result.get('error')
-                print(f"ComfyUI returned error: {error_detail}", file=sys.stderr)
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"ComfyUI error: {json.dumps(error_detail)}"
-                )
-            
-            prompt_id = result.get('prompt_id')
-            return {'status': 'completed', 'prompt_id': prompt_id, 'result': 'test'}
-        elif response.status_code == 400:
-            # ComfyUI returned 400 - this is a client error (bad workflow)
-            print(f"ComfyUI returned 400 Bad Request (sync)", file=sys.stderr)
-            print(f"Response body: {response.text[:500]}", file=sys.stderr)
-            try:
-                error_body = response.json()
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"ComfyUI validation error: {json.dumps(error_body)}"
-                )
-            except ValueError:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"ComfyUI validation error: {response.text[:500]}"
-                )
-        else:
-            # Other non-200 status codes are gateway/server errors
-            print(f"ERROR: ComfyUI returned non-200 status: {response.status_code}", file=sys.stderr)
-            print(f"Response body: {response.text[:500]}", file=sys.stderr)
-            raise HTTPException(
-                status_code=502, 
-                detail=f"ComfyUI error (HTTP {response.status_code}): {response.text[:500]}"
-            )
+        prompt_id = await _submit(request, '/runsync')
+        prompt_data = await wait_for_prompt(prompt_id, register_prompt(prompt_id))
+        error_msg = prompt_error(prompt_data)
+        if error_msg is not None:
+            print(f"Sync prompt {prompt_id} failed: {error_msg}", file=sys.stderr)
+            return ORJSONResponse(content={'status': 'failed', 'prompt_id': prompt_id, 'error': error_msg})
+        return ORJSONResponse(content={
+            'status': 'completed',
+            'prompt_id': prompt_id,
+            'output': {'images': collect_output_images(prompt_data['outputs'])},
+        })
     
     except HTTPException:
         raise
     except Exception as e:
-        error_trace = traceback.format_exc()
-        print(f"ERROR: Unhandled exception in /runsync endpoint:", file=sys.stderr)
-        print(error_trace, file=sys.stderr)
+        logger.exception("Unhandled exception in /runsync endpoint")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
 
-def monitor_job(job_id: str, prompt_id: str):
+async def fetch_prompt_history(prompt_id: str) -> Optional[Dict[str, Any]]:
+    """Return the ComfyUI history entry for a prompt, or None when it is not available yet."""
+
+    response = await get_comfy_http().get(f'{COMFY_HISTORY_PATH}/{prompt_id}', timeout=10)
+    if response.status_code != 200:
+        return None
+    return orjson.loads(response.content).get(prompt_id)
+
+
+async def fetch_recent_history() -> Dict[str, Any]:
+    """Return the most recent ComfyUI history entries keyed by prompt_id in a single request."""
+
+    response = await get_comfy_http().get(
+        COMFY_HISTORY_PATH, params={'max_items': HISTORY_POLL_MAX_ITEMS}, timeout=10
+    )
+    if response.status_code != 200:
+        return {}
+    return orjson.loads(response.content)
+
+
+def _resolve_from_history(history: Dict[str, Any]) -> None:
+    """Complete every pending prompt that already has a history entry."""
+
+    for prompt_id in [prompt_id for prompt_id in pending_prompts if prompt_id in history]:
+        future = pending_prompts.pop(prompt_id)
+        if not future.done():
+            future.set_result(history[prompt_id])
+
+
+def register_prompt(prompt_id: str) -> "asyncio.Future[Dict[str, Any]]":
+    """Register interest in a prompt's completion and return a future for its history entry."""
+
+    future: "asyncio.Future[Dict[str, Any]]" = asyncio.get_running_loop().create_future()
+    pending_prompts[prompt_id] = future
+
+    # The websocket may have reported the prompt before the /prompt response was processed
+    early_event = unclaimed_prompt_events.pop(prompt_id, None)
+    if early_event is not None:
+        _schedule_resolution(prompt_id, early_event)
+    return future
+
+
+def _schedule_resolution(prompt_id: str, event: Dict[str, Any]) -> None:
+    task = asyncio.create_task(_resolve_prompt(prompt_id, event))
+    monitor_tasks.add(task)
+    task.add_done_callback(monitor_tasks.discard)
+
+
+async def _resolve_prompt(prompt_id: str, event: Dict[str, Any]) -> None:
+    """Resolve a pending prompt future from a terminal websocket event."""
+
+    future = pending_prompts.pop(prompt_id, None)
+    if future is None or future.done():
+        return
+
+    if event.get("type") == "execution_error":
+        content = event.get("data", {})
+        future.set_result({
+            "error": (
+                f"ComfyUI execution error: Node Type: {content.get('node_type')}, "
+                f"Node ID: {content.get('node_id')}, Message: {content.get('exception_message')}"
+            )
+        })
+        return
+
+    try:
+        prompt_data = await fetch_prompt_history(prompt_id)
+    except Exception as exc:
+        result: Dict[str, Any] = {"error": f"Failed to fetch history: {exc}"}
+    else:
+        result = prompt_data if prompt_data is not None else {"error": "No history found for completed prompt"}
+
+    # The waiter may have timed out or been cancelled while history was being fetched
+    if not future.done():
+        future.set_result(result)
+
+
+def _dispatch_ws_message(data: Dict[str, Any]) -> None:
+    """Route a decoded ComfyUI websocket message to the prompt waiting on it."""
+
+    message_type = data.get("type")
+    content = data.get("data")
+    if not isinstance(content, dict):
+        return
+
+    prompt_id = content.get("prompt_id")
+    if not prompt_id:
+        return
+
+    is_terminal = (
+        message_type in ("execution_success", "execution_error")
+        or (message_type == "executing" and content.get("node") is None)
+    )
+    if not is_terminal:
+        return
+
+    if prompt_id in pending_prompts:
+        _schedule_resolution(prompt_id, data)
+        return
+
+    unclaimed_prompt_events[prompt_id] = data
+    while len(unclaimed_prompt_events) > UNCLAIMED_EVENTS_MAX:
+        unclaimed_prompt_events.popitem(last=False)
+
+
+async def ws_multiplexer() -> None:
+    """Consume ComfyUI's broadcast websocket once and fan completions out to pending prompts."""
+
+    delay = MONITOR_INITIAL_DELAY_S
+    while True:
+        try:
+            async with websockets.connect(COMFY_WS_CLIENT_URL, max_size=None) as ws:
+                print(f"Connected to ComfyUI websocket as client {WS_CLIENT_ID}")
+                delay = MONITOR_INITIAL_DELAY_S
+
+                # Completions may have been missed while disconnected
+                if pending_prompts:
+                    _resolve_from_history(await fetch_recent_history())
+
+                async for message in ws:
+                    # Binary frames carry image previews
+                    if isinstance(message, bytes):
+                        continue
+                    _dispatch_ws_message(orjson.loads(message))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"ComfyUI websocket error: {e}; reconnecting in {delay:.1f}s", file=sys.stderr)
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MONITOR_MAX_DELAY_S)
+
+
+async def history_poller() -> None:
     """
-    Background function to monitor ComfyUI job progress and update status.
+    Periodically check one shared /history snapshot for pending prompts, so a
+    dropped websocket event costs seconds rather than the full monitor timeout.
     """
+    while True:
+        await asyncio.sleep(HISTORY_POLL_INTERVAL_S)
+        if not pending_prompts:
+            continue
+        try:
+            _resolve_from_history(await fetch_recent_history())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"ComfyUI history poll failed: {e}", file=sys.stderr)
+
+
+async def wait_for_prompt(prompt_id: str, future: "asyncio.Future[Dict[str, Any]]") -> Dict[str, Any]:
+    """Wait for a registered prompt to finish, checking history once if the websocket stays silent."""
+
+    try:
+        return await asyncio.wait_for(future, timeout=MONITOR_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        pending_prompts.pop(prompt_id, None)
+
+    prompt_data = await fetch_prompt_history(prompt_id)
+    if prompt_data is not None and prompt_data.get('outputs'):
+        return prompt_data
+    return {"error": "Job timed out"}
+
+
+def collect_output_images(outputs: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Summarize the images listed in a ComfyUI history entry."""
+
+    result_images = []
+    for node_output in outputs.values():
+        for image_info in node_output.get("images", []):
+            filename = image_info.get("filename")
+            if filename:
+                # For now, just return the filename (in production, fetch actual image data)
+                result_images.append({
+                    "filename": filename,
+                    "type": "filename",  # Simplified for local testing
+                    "data": filename
+                })
+    return result_images
+
+
+def prompt_error(prompt_data: Dict[str, Any]) -> Optional[str]:
+    """Return the error message for a finished prompt, or None when it produced outputs."""
+
+    if "error" in prompt_data:
+        return prompt_data["error"]
+    if prompt_data.get('status', {}).get('errors'):
+        return f"ComfyUI execution error: {prompt_data['status']['errors']}"
+    if not prompt_data.get('outputs'):
+        return "ComfyUI finished without outputs"
+    return None
+
+
+async def monitor_job(job_id: str, prompt_id: str, future: "asyncio.Future[Dict[str, Any]]"):
+    """
+    Background task that waits for the websocket multiplexer to report the
+    prompt's completion and records the job status and results.
+    """
+    job_info: Dict[str, Any] = {}
     try:
         print(f"Starting background monitoring for job {job_id} (prompt {prompt_id})")
         
-        # Update status to running
-        job_status_store[job_id] = {
+        # Update status to running; keep a reference so eviction cannot break later updates
+        job_info = {
             "status": JobStatus.RUNNING.value,
             "prompt_id": prompt_id,
             "created_at": time.time(),
             "updated_at": time.time()
         }
-        
-        # Poll ComfyUI history endpoint to check job status
-        max_attempts = 300  # 5 minutes with 1 second intervals
-        for attempt in range(max_attempts):
-            try:
-                history_url = f'{COMFY_API_BASE}/history/{prompt_id}'
-                response = requests.get(history_url, timeout=10)
-                
-                if response.status_code == 200:
-                    history = response.json()
-                    if prompt_id in history:
-                        prompt_data = history[prompt_id]
-                        outputs = prompt_data.get('outputs', {})
-                        
-                        if outputs:
-                            # Job completed successfully
-                            print(f"Job {job_id} completed successfully")
-                            job_status_store[job_id]["status"] = JobStatus.COMPLETED.value
-                            job_status_store[job_id]["updated_at"] = time.time()
-                            
-                            # Process outputs (similar to runsync endpoint)
-                            result_images = []
-                            for node_id, node_output in outputs.items():
-                                if "images" in node_output:
-                                    for image_info in node_output["images"]:
-                                        filename = image_info.get("filename")
-                                        if filename:
-                                            # For now, just return the filename (in production, fetch actual image data)
-                                            result_images.append({
-                                                "filename": filename,
-                                                "type": "filename",  # Simplified for local testing
-                                                "data": filename
-                                            })
-                            
-                            job_results[job_id] = {
-                                "status": "completed",
-                                "output": {"images": result_images}
-                            }
-                            return
-                        else:
-                            # Check for execution errors
-                            if prompt_data.get('status', {}).get('errors'):
-                                error_msg = f"ComfyUI execution error: {prompt_data['status']['errors']}"
-                                print(f"Job {job_id} failed: {error_msg}")
-                                job_status_store[job_id]["status"] = JobStatus.FAILED.value
-                                job_status_store[job_id]["error"] = error_msg
-                                job_status_store[job_id]["updated_at"] = time.time()
-                                job_results[job_id] = {
-                                    "status": "failed",
-                                    "error": error_msg
-                                }
-                                return
-                
-                # Job still running, continue polling
-                time.sleep(1)
-                
-            except requests.RequestException as e:
-                print(f"Error polling job {job_id}: {e}")
-                time.sleep(1)
-                
-        # Job timed out
-        print(f"Job {job_id} timed out after {max_attempts} seconds")
-        job_status_store[job_id]["status"] = JobStatus.FAILED.value
-        job_status_store[job_id]["error"] = "Job timed out"
-        job_status_store[job_id]["updated_at"] = time.time()
+        job_status_store[job_id] = job_info
+
+        prompt_data = await wait_for_prompt(prompt_id, future)
+        error_msg = prompt_error(prompt_data)
+        if error_msg is None:
+            print(f"Job {job_id} completed successfully")
+            job_info["status"] = JobStatus.COMPLETED.value
+            job_info["updated_at"] = time.time()
+            job_results[job_id] = {
+                "status": "completed",
+                "output": {"images": collect_output_images(prompt_data['outputs'])}
+            }
+            return
+
+        print(f"Job {job_id} failed: {error_msg}")
+        job_info["status"] = JobStatus.FAILED.value
+        job_info["error"] = error_msg
+        job_info["updated_at"] = time.time()
         job_results[job_id] = {
             "status": "failed",
-            "error": "Job timed out"
+            "error": error_msg
         }
         
     except Exception as e:
         print(f"Unexpected error monitoring job {job_id}: {e}")
-        job_status_store[job_id]["status"] = JobStatus.FAILED.value
-        job_status_store[job_id]["error"] = f"Monitoring error: {str(e)}"
-        job_status_store[job_id]["updated_at"] = time.time()
+        job_info["status"] = JobStatus.FAILED.value
+        job_info["error"] = f"Monitoring error: {str(e)}"
+        job_info["updated_at"] = time.time()
         job_results[job_id] = {
             "status": "failed",
             "error": f"Monitoring error: {str(e)}"
@@ -445,10 +681,10 @@ async def status_endpoint(job_id: str):
     try:
         print(f"Status check for job {job_id}")
         
-        if job_id not in job_status_store:
+        job_info = job_status_store.get(job_id)
+        if job_info is None:
             raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
         
-        job_info = job_status_store[job_id]
         response_data = {
             "id": job_id,
             "status": job_info["status"].upper(),  # Match RunPod format (COMPLETED, FAILED, etc.)
@@ -461,17 +697,16 @@ async def status_endpoint(job_id: str):
             response_data["error"] = job_info["error"]
         
         # Include output if job completed
-        if job_info["status"] == JobStatus.COMPLETED.value and job_id in job_results:
-            response_data["output"] = job_results[job_id].get("output")
+        job_result = job_results.get(job_id)
+        if job_info["status"] == JobStatus.COMPLETED.value and job_result is not None:
+            response_data["output"] = job_result.get("output")
         
-        return response_data
+        return ORJSONResponse(content=response_data)
         
     except HTTPException:
         raise
     except Exception as e:
-        error_trace = traceback.format_exc()
-        print(f"ERROR: Unhandled exception in /status endpoint:", file=sys.stderr)
-        print(error_trace, file=sys.stderr)
+        logger.exception("Unhandled exception in /status endpoint")
         raise HTTPException(status_code=500, detail=f"Status check error: {str(e)}")
 
 
@@ -483,12 +718,12 @@ async def health_endpoint():
     """
     try:
         print("Health check: Checking ComfyUI connectivity...")
-        response = requests.get(f'{COMFY_API_BASE}/system_stats', timeout=5)
+        response = await get_comfy_http().get(COMFY_STATS_PATH, timeout=5)
         
         print(f"Health check response status: {response.status_code}")
         
         if response.status_code == 200:
-            return {'status': 'healthy', 'comfyui': 'connected'}
+            return Response(content=HEALTHY_BODY, media_type="application/json")
         else:
             print(f"ERROR: ComfyUI health check failed with status {response.status_code}", file=sys.stderr)
             raise HTTPException(
@@ -496,7 +731,7 @@ async def health_endpoint():
                 detail=f"ComfyUI health check failed (HTTP {response.status_code})"
             )
     
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"ERROR: Failed to connect to ComfyUI: {e}", file=sys.stderr)
         raise HTTPException(
             status_code=503, 
@@ -505,9 +740,7 @@ async def health_endpoint():
     except HTTPException:
         raise
     except Exception as e:
-        error_trace = traceback.format_exc()
-        print(f"ERROR: Unhandled exception in /health endpoint:", file=sys.stderr)
-        print(error_trace, file=sys.stderr)
+        logger.exception("Unhandled exception in /health endpoint")
         raise HTTPException(status_code=503, detail=f"Health check error: {str(e)}")
 
 
@@ -516,17 +749,32 @@ async def global_exception_handler(request: Request, exc: Exception):
     """
     Global exception handler to catch any unhandled exceptions.
     """
-    error_trace = traceback.format_exc()
-    print(f"ERROR: Unhandled exception:", file=sys.stderr)
-    print(error_trace, file=sys.stderr)
-    
-    return JSONResponse(
+    # exc_info defers traceback formatting to the handlers that actually emit the record
+    logger.error("Unhandled exception on %s", request.url.path, exc_info=exc)
+
+    return ORJSONResponse(
         status_code=500,
         content={"detail": f"Internal server error: {str(exc)}"}
     )
 
 
 if __name__ == '__main__':
+    logging.basicConfig(
+        level=getattr(logging, LOG_LEVEL.upper(), logging.INFO),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
     print("Starting RunPod API server on http://0.0.0.0:3000")
     print(f"ComfyUI API base: {COMFY_API_BASE}")
-    uvicorn.run(app, host='0.0.0.0', port=3000, log_level="info")
+    # Job state and the websocket multiplexer live in-process, so extra workers only
+    # make sense behind sticky routing; keep the default at a single worker.
+    uvicorn.run(
+        "api_server:app",
+        host='0.0.0.0',
+        port=3000,
+        workers=API_SERVER_WORKERS,
+        # "auto" picks uvloop/httptools when installed; uvloop has no Windows build
+        loop="auto",
+        http="auto",
+        log_level="warning",
+        access_log=False,
+    )
@@ -0,0 +1,26 @@
+"""Base64 helpers that use the SIMD pybase64 codec when it is installed."""
+from __future__ import annotations
+
+import base64
+from typing import Union
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+try:
+    import pybase64
+except ModuleNotFoundError:
+    pybase64 = None  # type: ignore[assignment]
+
+
+def b64encode_str(data: BytesLike) -> str:
+    """Return ``data`` base64-encoded as an ASCII ``str``."""
+    if pybase64 is not None:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode("ascii")
+
+
+def b64decode(data: BytesLike) -> bytes:
+    """Decode base64 ``data`` without the strict alphabet validation pass."""
+    if pybase64 is not None:
+        return pybase64.b64decode(data, validate=False)
+    return base64.b64decode(data)
@@ -1,13 +1,16 @@
 """HTTP and websocket client for interacting with the local ComfyUI instance."""
 from __future__ import annotations
 
-import json
 import logging
 import os
+import secrets
+import socket
 import time
-import uuid
-from typing import Any, Dict, Optional
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterator, Optional
+from urllib.parse import urlsplit
 
+import orjson
 import requests
 import websocket
 from requests.adapters import HTTPAdapter, Retry
@@ -15,13 +18,46 @@ from requests.adapters import HTTPAdapter, Retry
 from config import (
     BASE_URI,
     COMFY_API_AVAILABLE_INTERVAL_MS,
+    COMFY_API_AVAILABLE_MAX_DELAY_S,
     COMFY_API_AVAILABLE_MAX_RETRIES,
     COMFY_HISTORY_ATTEMPTS,
     COMFY_HISTORY_DELAY_SECONDS,
+    COMFY_HTTP_POOL_SIZE,
     TIMEOUT,
+    WEBSOCKET_RECONNECT_ATTEMPTS,
+    WEBSOCKET_PING_TIMEOUT_S,
+    WEBSOCKET_RECONNECT_DELAY_S,
+    WEBSOCKET_RECV_TIMEOUT_S,
 )
 from logging_utils import debug_log_websocket, log_with_job
 
+JSON_HEADERS = {"Content-Type": "application/json"}
+_COMFY_URL = urlsplit(BASE_URI)
+_COMFY_ADDRESS = (_COMFY_URL.hostname or "127.0.0.1", _COMFY_URL.port or 80)
+
+
+# TCP keepalive lets a crashed ComfyUI surface as a closed websocket within ~30s
+# instead of the kernel default of two hours.
+_WS_SOCKOPTS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+if hasattr(socket, "TCP_KEEPIDLE"):
+    _WS_SOCKOPTS += [
+        (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 15),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 5),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3),
+    ]
+
+_READ_CHUNK_BYTES = 1024 * 1024
+
+# Message types _handle_websocket_message acts on, as they appear quoted in the raw frame
+_WS_STATUS_MARKERS = (b'"executing"', b'"execution_end"', b'"progress_state"', b'"execution_error"')
+
+
+def _port_open() -> bool:
+    """Return True when a TCP connection to the ComfyUI port succeeds."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(1)
+        return sock.connect_ex(_COMFY_ADDRESS) == 0
+
 
 class ComfyClient:
     """Client encapsulating all network interactions with ComfyUI."""
@@ -33,55 +69,116 @@ class ComfyClient:
             backoff_factor=1,
             status_forcelist=[429, 500, 502, 503, 504],
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        # Every call targets the single local ComfyUI host; keep enough pooled connections
+        # for concurrent output downloads so none of them falls back to a throwaway socket.
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=COMFY_HTTP_POOL_SIZE,
+            max_retries=retry_strategy,
+        )
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
 
+        # One websocket per worker, reused across jobs; prompts are queued under this
+        # client id so ComfyUI routes their progress messages to it.
+        self.client_id = secrets.token_hex(8)
+        self._ws_url = f"ws://127.0.0.1:8188/ws?clientId={self.client_id}"
+        self._ws: Optional[websocket.WebSocket] = None
+
     def check_server(self) -> bool:
-        """Return True when the ComfyUI REST endpoint is reachable."""
+        """Return True when the ComfyUI REST endpoint is reachable.
+
+        Waits for the port with bare TCP connects, then confirms with one HEAD on the
+        pooled session. Backs off exponentially between attempts, within the same overall
+        time budget as COMFY_API_AVAILABLE_MAX_RETRIES probes spaced
+        COMFY_API_AVAILABLE_INTERVAL_MS apart.
+        """
         logging.info("Checking ComfyUI server at %s", BASE_URI)
 
-        for _ in range(COMFY_API_AVAILABLE_MAX_RETRIES):
-            try:
-                response = self.session.get(BASE_URI, timeout=5)
-            except requests.RequestException:
-                response = None
+        delay = COMFY_API_AVAILABLE_INTERVAL_MS / 1000
+        deadline = time.monotonic() + COMFY_API_AVAILABLE_MAX_RETRIES * delay
+        attempts = 0
 
-            if response and response.status_code == 200:
-                logging.info("ComfyUI server is reachable")
-                return True
+        while True:
+            attempts += 1
+            if _port_open():
+                try:
+                    response = self.session.head(BASE_URI, timeout=2)
+                except requests.RequestException:
+                    response = None
 
-            time.sleep(COMFY_API_AVAILABLE_INTERVAL_MS / 1000)
+                if response is not None and response.status_code == 200:
+                    logging.info("ComfyUI server is reachable")
+                    return True
 
-        logging.error(
-            "Failed to connect to ComfyUI server after %s attempts",
-            COMFY_API_AVAILABLE_MAX_RETRIES,
-        )
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, COMFY_API_AVAILABLE_MAX_DELAY_S)
+
+        logging.error("Failed to connect to ComfyUI server after %s attempts", attempts)
         return False
 
     def send_get(self, endpoint: str) -> requests.Response:
         return self.session.get(f"{BASE_URI}/{endpoint}", timeout=TIMEOUT)
 
     def send_post(self, endpoint: str, payload: Dict[str, Any]) -> requests.Response:
-        return self.session.post(f"{BASE_URI}/{endpoint}", json=payload, timeout=TIMEOUT)
+        return self.session.post(
+            f"{BASE_URI}/{endpoint}",
+            data=orjson.dumps(payload),
+            headers=JSON_HEADERS,
+            timeout=TIMEOUT,
+        )
 
-    def upload_image(self, filename: str, file_path: str) -> None:
-        with open(file_path, "rb") as file_handle:
-            files = {"image": (filename, file_handle, "image/png"), "overwrite": (None, "true")}
-            response = self.session.post(f"{BASE_URI}/upload/image", files=files, timeout=30)
-            response.raise_for_status()
+    def upload_image(self, filename: str, data: bytes, mime_type: str = "image/png") -> None:
+        self.upload_input_file(filename, data, mime_type, timeout=30)
+
+    def upload_input_file(self, filename: str, data: bytes, mime_type: str, timeout: float = 60) -> None:
+        """Upload an input file through ComfyUI's /upload/image endpoint, replacing any same-named file."""
+        files = {"image": (filename, data, mime_type), "overwrite": (None, "true")}
+        response = self.session.post(f"{BASE_URI}/upload/image", files=files, timeout=timeout)
+        response.raise_for_status()
 
-    def upload_input_file(self, filename: str, file_path: str, mime_type: str) -> None:
-        with open(file_path, "rb") as file_handle:
-            files = {"image": (filename, file_handle, mime_type), "overwrite": (None, "true")}
-            response = self.session.post(f"{BASE_URI}/upload/image", files=files, timeout=60)
+    def get_output_file_data(self, filename: str, subfolder: str, file_type: str) -> bytearray:
+        """Read an output file into a single buffer.
+
+        ``response.content`` joins a list of small chunks, briefly holding the file twice;
+        reading into one preallocated buffer keeps peak memory at the file size.
+        """
+        params = {"filename": filename, "subfolder": subfolder, "type": file_type}
+        with self.session.get(f"{BASE_URI}/view", params=params, timeout=30, stream=True) as response:
             response.raise_for_status()
+            raw = response.raw
+            raw.decode_content = True
+            length = response.headers.get("Content-Length")
+            if length is None or "Content-Encoding" in response.headers:
+                buffer = bytearray()
+                while chunk := raw.read(_READ_CHUNK_BYTES):
+                    buffer += chunk
+                return buffer
 
-    def get_output_file_data(self, filename: str, subfolder: str, file_type: str) -> bytes:
+            buffer = bytearray(int(length))
+            view = memoryview(buffer)
+            filled = 0
+            while filled < len(buffer):
+                # urllib3's readinto reads len(view) bytes into a temporary first, so bound
+                # each call or the whole remaining body is briefly held twice
+                read = raw.readinto(view[filled:filled + _READ_CHUNK_BYTES])
+                if not read:
+                    raise IOError(f"Truncated download of {filename}: {filled}/{len(buffer)} bytes")
+                filled += read
+            return buffer
+
+    @contextmanager
+    def open_output_stream(self, filename: str, subfolder: str, file_type: str) -> Iterator[BinaryIO]:
+        """Yield a readable stream over an output file without buffering it whole."""
         params = {"filename": filename, "subfolder": subfolder, "type": file_type}
-        response = self.session.get(f"{BASE_URI}/view", params=params, timeout=30)
-        response.raise_for_status()
-        return response.content
+        with self.session.get(f"{BASE_URI}/view", params=params, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            yield response.raw
 
     def fetch_history(self, prompt_id: str, job_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
         for attempt in range(COMFY_HISTORY_ATTEMPTS):
@@ -96,8 +193,8 @@ class ComfyClient:
             else:
                 if response.status_code == 200:
                     try:
-                        history = response.json()
-                    except json.JSONDecodeError as exc:
+                        history = orjson.loads(response.content)
+                    except orjson.JSONDecodeError as exc:
                         log_with_job(logging.error, f"Invalid history JSON: {exc}", job_id)
                     else:
                         if prompt_id in history:
@@ -113,20 +210,64 @@ class ComfyClient:
 
         return None
 
-    def monitor_prompt(self, prompt_id: str, job_id: str) -> Dict[str, Any]:
-        client_id = str(uuid.uuid4())
-        ws_url = f"ws://127.0.0.1:8188/ws?clientId={client_id}"
+    def connect_websocket(self) -> websocket.WebSocket:
+        """Return a live websocket for the next prompt, reconnecting when the old one is dead.
 
+        Call before queueing a prompt so no completion message can be sent before we listen.
+        A reused socket is pinged first: after a half-open drop ``connected`` stays True
+        until a receive fails, which would otherwise cost the job a full receive timeout.
+        """
+        if self._ws is not None and self._ws.connected and not self._answers_ping(self._ws):
+            logging.warning("ComfyUI websocket did not answer a ping; reconnecting")
+            self._discard_websocket()
+        return self._websocket()
+
+    def _websocket(self) -> websocket.WebSocket:
+        if self._ws is None:
+            self._ws = websocket.WebSocket(sockopt=_WS_SOCKOPTS)
+        if not self._ws.connected:
+            self._ws.connect(self._ws_url, timeout=WEBSOCKET_RECV_TIMEOUT_S)
+            logging.info("Connected to ComfyUI websocket as client %s", self.client_id)
+        return self._ws
+
+    @staticmethod
+    def _answers_ping(ws: websocket.WebSocket) -> bool:
+        # Only safe before queueing: frames read while waiting for the pong are discarded
+        try:
+            ws.settimeout(WEBSOCKET_PING_TIMEOUT_S)
+            ws.ping()
+            while True:
+                opcode, _ = ws.recv_data(control_frame=True)
+                if opcode == websocket.ABNF.OPCODE_PONG:
+                    return True
+        except Exception:
+            return False
+        finally:
+            ws.settimeout(WEBSOCKET_RECV_TIMEOUT_S)
+
+    def _discard_websocket(self) -> None:
+        if self._ws is not None:
+            self._ws.close()
+            self._ws = None
+
+    def monitor_prompt(self, prompt_id: str, job_id: str) -> Dict[str, Any]:
         try:
-            ws = websocket.WebSocket()
-            ws.connect(ws_url)
-            logging.info("Connected to ComfyUI websocket for job %s", job_id)
+            # No ping here: the prompt is already queued and its frames must not be skipped
+            ws = self._websocket()
+            prompt_marker = prompt_id.encode()
 
             while True:
                 try:
-                    message = ws.recv()
-                    debug_log_websocket(message, job_id)
-                    data = json.loads(message)
+                    # recv_data hands back the raw frame bytes, which orjson parses without a str decode
+                    opcode, frame = ws.recv_data()
+                    # Binary frames carry image previews, never status messages
+                    if opcode != websocket.ABNF.OPCODE_TEXT:
+                        continue
+                    debug_log_websocket(frame, job_id)
+                    # Per-step progress and other prompts' traffic dominate; only parse frames that can matter
+                    if prompt_marker not in frame or not any(marker in frame for marker in _WS_STATUS_MARKERS):
+                        continue
+                    data = orjson.loads(frame)
                     websocket_result = self._handle_websocket_message(data, prompt_id, job_id)
                     if websocket_result is True:
                         break
@@ -136,11 +277,13 @@ class ComfyClient:
                     log_with_job(logging.debug, "Websocket receive timed out, continuing...", job_id)
                     continue
                 except websocket.WebSocketConnectionClosedException:
-                    if not self._attempt_reconnect(ws, ws_url, job_id):
+                    if not self._attempt_reconnect(ws, self._ws_url, job_id):
+                        self._discard_websocket()
                         return {"error": "Websocket connection lost"}
-            ws.close()
         except Exception as exc:
             log_with_job(logging.error, f"Websocket monitoring error: {exc}", job_id)
+            # Start the next job on a fresh connection rather than a half-read stream
+            self._discard_websocket()
             fallback = self.fetch_history(prompt_id, job_id)
             if fallback is not None:
                 return fallback
@@ -164,7 +307,8 @@ class ComfyClient:
             if node is None:
                 log_with_job(logging.info, f"Workflow completed for prompt: {prompt_id}", job_id)
                 return True
-            log_with_job(logging.debug, f"Executing node: {node}", job_id)
+            if logging.root.isEnabledFor(logging.DEBUG):
+                log_with_job(logging.debug, f"Executing node: {node}", job_id)
         elif message_type == "execution_end" and content.get("prompt_id") == prompt_id:
             log_with_job(logging.info, f"Workflow completed for prompt: {prompt_id}", job_id)
             return True
@@ -184,15 +328,16 @@ class ComfyClient:
         return False
 
     def _attempt_reconnect(self, ws: websocket.WebSocket, ws_url: str, job_id: str) -> bool:
-        from config import WEBSOCKET_RECONNECT_ATTEMPTS, WEBSOCKET_RECONNECT_DELAY_S
-
         log_with_job(logging.warning, "Websocket connection closed, attempting to reconnect...", job_id)
+        delay = WEBSOCKET_RECONNECT_DELAY_S
         for attempt in range(WEBSOCKET_RECONNECT_ATTEMPTS):
             try:
-                ws.connect(ws_url)
+                ws.connect(ws_url, timeout=WEBSOCKET_RECV_TIMEOUT_S)
                 log_with_job(logging.info, "Websocket reconnected successfully", job_id)
                 return True
             except Exception as exc:  # pragma: no cover - best-effort reconnect
                 log_with_job(logging.error, f"Failed to reconnect websocket: {exc}", job_id)
-                time.sleep(WEBSOCKET_RECONNECT_DELAY_S)
+                if attempt + 1 < WEBSOCKET_RECONNECT_ATTEMPTS:
+                    time.sleep(delay)
+                    delay *= 2
         return False
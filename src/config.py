@@ -8,12 +8,20 @@ BASE_URI = "http://127.0.0.1:8188"
 LOG_FILE = "comfyui-worker.log"
 TIMEOUT = 600
 LOG_LEVEL = os.getenv("COMFY_LOG_LEVEL", "INFO")
-DISK_MIN_FREE_BYTES = 500 * 1024 * 1024  # 500MB
+LOG_QUEUE_MAX_SIZE = int(os.environ.get("LOG_QUEUE_MAX_SIZE", 10000))
+DISK_MIN_FREE_BYTES = int(os.environ.get("DISK_MIN_FREE_BYTES", 500 * 1024 * 1024))  # 500MB; <= 0 disables the check
 COMFY_API_AVAILABLE_INTERVAL_MS = 50
 COMFY_API_AVAILABLE_MAX_RETRIES = 500
+COMFY_API_AVAILABLE_MAX_DELAY_S = 2.0
+COMFY_HTTP_POOL_SIZE = int(os.environ.get("COMFY_HTTP_POOL_SIZE", 8))
+OUTPUT_FETCH_WORKERS = int(os.environ.get("OUTPUT_FETCH_WORKERS", 4))
 WEBSOCKET_RECONNECT_ATTEMPTS = int(os.environ.get("WEBSOCKET_RECONNECT_ATTEMPTS", 5))
 WEBSOCKET_RECONNECT_DELAY_S = int(os.environ.get("WEBSOCKET_RECONNECT_DELAY_S", 3))
+WEBSOCKET_RECV_TIMEOUT_S = float(os.environ.get("WEBSOCKET_RECV_TIMEOUT_S", 30))
+WEBSOCKET_PING_TIMEOUT_S = float(os.environ.get("WEBSOCKET_PING_TIMEOUT_S", 2))
 WS_DEBUG_FILE = os.environ.get("COMFY_WS_DEBUG_FILE", "/comfyui/ws.log")
 COMFY_HISTORY_ATTEMPTS = int(os.environ.get("COMFY_HISTORY_ATTEMPTS", 600))
 COMFY_HISTORY_DELAY_SECONDS = float(os.environ.get("COMFY_HISTORY_DELAY_SECONDS", 2))
+COMFY_HISTORY_MIN_DELAY_SECONDS = float(os.environ.get("COMFY_HISTORY_MIN_DELAY_SECONDS", 0.1))
 ENSURE_ASSETS_TIMEOUT_S = float(os.environ.get("ENSURE_ASSETS_TIMEOUT_S", 300))
+API_SERVER_WORKERS = int(os.environ.get("API_SERVER_WORKERS", 1))
@@ -13,8 +13,8 @@ CURRENT_DIR = Path(__file__).resolve().parent
 if str(CURRENT_DIR) not in sys.path:
     sys.path.insert(0, str(CURRENT_DIR))
 
+import orjson
 import runpod
-import torch
 from runpod.serverless.utils.rp_validator import validate
 
 from input_schema import INPUT_SCHEMA
@@ -23,10 +23,11 @@ from comfy_client import ComfyClient
 from config import (
     APP_NAME,
     COMFY_HISTORY_DELAY_SECONDS,
+    COMFY_HISTORY_MIN_DELAY_SECONDS,
     DISK_MIN_FREE_BYTES,
     ENSURE_ASSETS_TIMEOUT_S,
 )
-from logging_utils import log_with_job, setup_logging
+from logging_utils import log_with_job, set_current_job_id, setup_logging
 from outputs import OutputProcessor
 from telemetry import get_container_disk_info, get_container_memory_info
 from workflows import (
@@ -43,10 +44,6 @@ from workflows import (
     workflow_requires_prompt,
 )
 
-torch.backends.cuda.enable_flash_sdp(False)
-torch.backends.cuda.matmul.allow_tf32 = True
-torch.set_float32_matmul_precision("medium")
-
 client = ComfyClient()
 output_processor = OutputProcessor(client)
 
@@ -56,6 +53,7 @@ def handler(event: Dict[str, Any]) -> Dict[str, Any]:
 
     job_id = event["id"]
     os.environ["RUNPOD_JOB_ID"] = job_id
+    set_current_job_id(job_id)
 
     try:
         log_with_job(logging.info, "Starting job", job_id)
@@ -146,12 +144,19 @@ def handler(event: Dict[str, Any]) -> Dict[str, Any]:
         )
 
         log_with_job(logging.info, "Submitting workflow to ComfyUI", job_id)
-        response = client.send_post("prompt", {"prompt": workflow})
+        try:
+            client.connect_websocket()
+        except Exception as exc:
+            # monitor_prompt retries the connection and falls back to /history polling
+            log_with_job(logging.warning, f"Websocket not connected before queueing: {exc}", job_id)
+        response = client.send_post("prompt", {"prompt": workflow, "client_id": client.client_id})
 
         if response.status_code != 200:
             raise RuntimeError(f"Failed to queue workflow: {response.text}")
 
-        prompt_id = response.json().get("prompt_id")
+        prompt_id = orjson.loads(response.content).get("prompt_id")
+        if not prompt_id:
+            raise RuntimeError(f"ComfyUI did not return a prompt_id: {response.text}")
         log_with_job(logging.info, f"Workflow queued successfully: {prompt_id}", job_id)
 
         result = client.monitor_prompt(prompt_id, job_id)
@@ -201,9 +206,12 @@ def _ensure_final_assets(
     latest_result = result
     deadline = time.monotonic() + ENSURE_ASSETS_TIMEOUT_S
     attempt = 0
+    # Assets usually land within moments of completion; start polling fast and back off
+    delay = min(COMFY_HISTORY_MIN_DELAY_SECONDS, COMFY_HISTORY_DELAY_SECONDS)
 
-    while time.monotonic() < deadline:
-        time.sleep(COMFY_HISTORY_DELAY_SECONDS)
+    while (remaining := deadline - time.monotonic()) > 0:
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, COMFY_HISTORY_DELAY_SECONDS)
         attempt += 1
         refreshed = client.fetch_history(prompt_id, job_id)
         if refreshed is None:
@@ -276,7 +284,8 @@ def _has_final_assets(result: Dict[str, Any]) -> bool:
 
 def _check_resources(job_id: str) -> bool:
     memory_info = get_container_memory_info(job_id)
-    disk_info = get_container_disk_info(job_id)
+    # Skip the statvfs call entirely when the disk gate is disabled
+    disk_info = get_container_disk_info(job_id) if DISK_MIN_FREE_BYTES > 0 else {}
 
     memory_available_gb = memory_info.get("available")
     disk_free_bytes = disk_info.get("free")
@@ -1,11 +1,17 @@
 """Logging utilities for the RunPod-ComfyUI worker."""
 from __future__ import annotations
 
+import atexit
 import logging
+import logging.handlers
+import queue
+import sys
+import threading
 from datetime import datetime
-from typing import Callable, Optional
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Union
 
 import os
+import orjson
 import requests
 try:
     from runpod.serverless.modules.rp_logger import RunPodLogger
@@ -26,7 +32,16 @@ except ModuleNotFoundError:
         def error(self, *_: object, **__: object) -> None:
             return
 
-from config import APP_NAME, LOG_LEVEL, WS_DEBUG_FILE
+from config import APP_NAME, LOG_LEVEL, LOG_QUEUE_MAX_SIZE, WS_DEBUG_FILE
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_current_job_id: Optional[str] = os.getenv("RUNPOD_JOB_ID")
+
+
+def set_current_job_id(job_id: Optional[str]) -> None:
+    """Record the job being handled so log records can be tagged without env lookups."""
+    global _current_job_id
+    _current_job_id = job_id
 
 
 def log_with_job(level_func: Callable[[str], None], message: str, job_id: Optional[str]) -> None:
@@ -38,30 +53,61 @@ def log_with_job(level_func: Callable[[str], None], message: str, job_id: Option
     level_func(message)
 
 
-def debug_log_websocket(message: str, job_id: Optional[str]) -> None:
-    """Write websocket payloads to the configured debug file when enabled."""
-    if not WS_DEBUG_FILE:
-        return
+def _write_websocket_debug(message: Union[str, bytes], job_id: Optional[str]) -> None:
+    """Append a websocket payload to the debug file through one long-lived handle."""
+    global _ws_debug_file
+    if isinstance(message, str):
+        message = message.encode("utf-8", "replace")
 
     try:
+        if _ws_debug_file is None:
+            # Unbuffered O_APPEND handle: each frame is one write() that reaches the file
+            # immediately, so the tail survives a killed worker (what a hung prompt needs)
+            _ws_debug_file = open(WS_DEBUG_FILE, "ab", buffering=0)
+            atexit.register(_ws_debug_file.close)
         timestamp = datetime.utcnow().isoformat()
-        with open(WS_DEBUG_FILE, "a", encoding="utf-8") as debug_file:
-            if job_id:
-                debug_file.write(f"{timestamp} | job_id={job_id} | {message}\n")
-            else:
-                debug_file.write(f"{timestamp} | {message}\n")
+        prefix = f"{timestamp} | job_id={job_id} | " if job_id else f"{timestamp} | "
+        _ws_debug_file.write(prefix.encode() + message + b"\n")
     except Exception as exc:  # pragma: no cover - best-effort debug logging
         logging.error("Failed to write websocket debug log: %s", exc)
 
 
+def _skip_websocket_debug(message: Union[str, bytes], job_id: Optional[str]) -> None:
+    return
+
+
+_ws_debug_file: Optional[BinaryIO] = None
+_RUNPOD_LOG_MAX_CHARS = 1000
+
+# Bound once so the websocket receive loop pays no per-frame check when disabled
+debug_log_websocket: Callable[[Union[str, bytes], Optional[str]], None] = (
+    _write_websocket_debug if WS_DEBUG_FILE else _skip_websocket_debug
+)
+
+
 class SnapLogHandler(logging.Handler):
-    """Custom log handler that forwards logs to RunPod telemetry and optional HTTP endpoint."""
+    """Custom log handler that forwards logs to RunPod telemetry and optional HTTP endpoint.
+
+    External records are buffered and posted as a JSON array once ``LOG_API_BATCH_SIZE``
+    records accumulate or ``LOG_API_FLUSH_INTERVAL_S`` seconds pass.
+    """
+
+    _LEVEL_METHODS = {
+        logging.DEBUG: "debug",
+        logging.INFO: "info",
+        logging.WARNING: "warn",
+        logging.ERROR: "error",
+        logging.CRITICAL: "error",
+    }
 
     def __init__(self, app_name: str = APP_NAME) -> None:
         super().__init__()
         self.app_name = app_name
         self.rp_logger = RunPodLogger()
         self.rp_logger.set_level(LOG_LEVEL)
+        self._level_loggers = {
+            levelno: getattr(self.rp_logger, method) for levelno, method in self._LEVEL_METHODS.items()
+        }
 
         # RunPod environment metadata
         self.runpod_endpoint_id = os.getenv("RUNPOD_ENDPOINT_ID")
@@ -79,10 +125,25 @@ class SnapLogHandler(logging.Handler):
         self.log_api_endpoint = os.getenv("LOG_API_ENDPOINT")
         self.log_api_timeout = int(os.getenv("LOG_API_TIMEOUT", "5"))
         self.log_token = os.getenv("LOG_API_TOKEN")
+        self._has_external = bool(self.log_api_endpoint)
+        self.log_api_batch_size = int(os.getenv("LOG_API_BATCH_SIZE", "50"))
+        self.log_api_flush_interval = float(os.getenv("LOG_API_FLUSH_INTERVAL_S", "5"))
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._buffer_lock = threading.Lock()
+        self._session = requests.Session()
+        self._stopping = threading.Event()
+        self._flush_requested = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        if self._has_external:
+            self._flush_thread = threading.Thread(
+                target=self._flush_periodically, name="snaplog-flush", daemon=True
+            )
+            self._flush_thread.start()
 
     def emit(self, record: logging.LogRecord) -> None:  # pragma: no cover - logging integration
         """Emit a log record to RunPod's logger and, optionally, an external HTTP endpoint."""
-        runpod_job_id = os.getenv("RUNPOD_JOB_ID")
+        runpod_job_id = getattr(record, "runpod_job_id", _current_job_id)
 
         try:
             message = self._format_message(record)
@@ -100,17 +161,11 @@ class SnapLogHandler(logging.Handler):
         return str(record.msg)
 
     def _emit_runpod_log(self, levelno: int, message: str, job_id: Optional[str]) -> None:
-        if len(message) > 1000:
-            return
+        if len(message) > _RUNPOD_LOG_MAX_CHARS:
+            # Keep the head of long records (e.g. tracebacks) rather than dropping them
+            message = message[: _RUNPOD_LOG_MAX_CHARS - 3] + "..."
 
-        level_mapping = {
-            logging.DEBUG: self.rp_logger.debug,
-            logging.INFO: self.rp_logger.info,
-            logging.WARNING: self.rp_logger.warn,
-            logging.ERROR: self.rp_logger.error,
-            logging.CRITICAL: self.rp_logger.error,
-        }
-        rp_logger = level_mapping.get(levelno, self.rp_logger.info)
+        rp_logger = self._level_loggers.get(levelno, self.rp_logger.info)
 
         if job_id:
             rp_logger(message, job_id)
@@ -119,12 +174,12 @@ class SnapLogHandler(logging.Handler):
         rp_logger(message)
 
     def _emit_external_log(self, record: logging.LogRecord, message: str, job_id: Optional[str]) -> None:
-        if not self.log_api_endpoint:
+        if not self._has_external:
             return
 
         payload = {
             "app_name": self.app_name,
-            "log_asctime": self.formatter.formatTime(record),
+            "log_asctime_epoch": record.created,
             "log_levelname": record.levelname,
             "log_message": message,
             "runpod_endpoint_id": self.runpod_endpoint_id,
@@ -137,35 +192,130 @@ class SnapLogHandler(logging.Handler):
             "runpod_pod_hostname": self.runpod_pod_hostname,
         }
 
-        headers = {"Authorization": f"Bearer {self.log_token}"} if self.log_token else None
+        with self._buffer_lock:
+            self._buffer.append(payload)
+            full = len(self._buffer) >= self.log_api_batch_size
+        if full:
+            # Hand the POST to the flush thread so the listener keeps feeding RunPod's logger
+            self._flush_requested.set()
+
+    def _flush_periodically(self) -> None:
+        while not self._stopping.is_set():
+            self._flush_requested.wait(self.log_api_flush_interval)
+            self._flush_requested.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Post any buffered records to the external endpoint in one request."""
+        with self._buffer_lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+
+        headers = {"Content-Type": "application/json"}
+        if self.log_token:
+            headers["Authorization"] = f"Bearer {self.log_token}"
 
         try:
-            requests.post(
+            self._session.post(
                 self.log_api_endpoint,
                 headers=headers,
-                json=payload,
+                data=orjson.dumps(batch),
                 timeout=self.log_api_timeout,
             )
         except Exception as exc:
-            print(f"Failed to send log to external API: {exc}")
+            print(f"Failed to send {len(batch)} logs to external API: {exc}")
+
+    def close(self) -> None:
+        self._stopping.set()
+        self._flush_requested.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join(timeout=self.log_api_timeout)
+        self.flush()
+        self._session.close()
+        super().close()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._burst_dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        # Capture the job now; the listener thread may run after the next job has started
+        record.runpod_job_id = _current_job_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # Once the queue drains, log how many records the last burst lost
+        if self._burst_dropped and self._put(self._drop_summary()):
+            self._burst_dropped = 0
+        if self._put(record):
+            return
+
+        if not self._burst_dropped:
+            sys.stderr.write("Log queue full; dropping log records until it drains\n")
+        self.dropped += 1
+        self._burst_dropped += 1
+
+    def _put(self, record: logging.LogRecord) -> bool:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            return False
+        return True
+
+    def _drop_summary(self) -> logging.LogRecord:
+        return self.prepare(logging.LogRecord(
+            __name__,
+            logging.WARNING,
+            __file__,
+            0,
+            "%d log records dropped while the log queue was full",
+            (self._burst_dropped,),
+            None,
+        ))
 
 
 def setup_logging(app_name: str = APP_NAME) -> logging.Logger:
-    """Initialize logging for the worker and return the configured logger."""
+    """Initialize logging for the worker and return the configured logger.
+
+    Records are queued on the calling thread and written by a background listener,
+    so slow sinks such as the external log endpoint never block job handling.
+    """
+    global _listener
+
     logger = logging.getLogger(app_name)
     logger.setLevel(getattr(logging, LOG_LEVEL.upper(), logging.INFO))
 
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
+    if _listener is not None:
+        atexit.unregister(_listener.stop)
+        _listener.stop()
+        # stop() drained the queue; closing flushes SnapLogHandler's batch and ends its thread
+        for handler in _listener.handlers:
+            handler.close()
 
     formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
     custom_handler = SnapLogHandler(app_name)
     custom_handler.setFormatter(formatter)
-    logger.addHandler(custom_handler)
 
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_MAX_SIZE)
+    logger.addHandler(DroppingQueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, custom_handler, console_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_listener.stop)
 
     return logger
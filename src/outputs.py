@@ -1,15 +1,58 @@
 """Processing utilities for ComfyUI workflow outputs."""
 from __future__ import annotations
 
-import base64
 import logging
+import mimetypes
 import os
-import tempfile
-from typing import TYPE_CHECKING, Any, Dict, List
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Tuple, TypeVar
+
+from base64_codec import b64encode_str
+from config import OUTPUT_FETCH_WORKERS
 
 if TYPE_CHECKING:  # pragma: no cover - for type checking only
     from comfy_client import ComfyClient
 
+T = TypeVar("T")
+
+S3_TRANSFER_CHUNK_BYTES = 8 * 1024 * 1024
+S3_PRESIGNED_URL_TTL_S = 604800
+_VIDEO_EXTENSIONS = (".mp4", ".mov", ".webm", ".mkv", ".avi")
+
+# (bucket key, filename, subfolder, ComfyUI file type)
+Asset = Tuple[str, str, str, str]
+
+
+@lru_cache(maxsize=1)
+def _output_executor() -> ThreadPoolExecutor:
+    """Shared pool so warm workers don't spin up fresh threads for every job."""
+    return ThreadPoolExecutor(max_workers=OUTPUT_FETCH_WORKERS, thread_name_prefix="output-fetch")
+
+
+@lru_cache(maxsize=1)
+def _s3_client() -> Tuple[Any, Any]:
+    """Create the boto3 client once per worker instead of once per uploaded asset."""
+    from runpod.serverless.utils import rp_upload
+
+    s3_client, _ = rp_upload.get_boto_client()
+    if s3_client is None:
+        return None, None
+
+    from boto3.s3.transfer import TransferConfig
+
+    # rp_upload's own TransferConfig uses tiny 25KB parts; video outputs want far fewer, larger ones
+    transfer_config = TransferConfig(
+        multipart_threshold=S3_TRANSFER_CHUNK_BYTES,
+        multipart_chunksize=S3_TRANSFER_CHUNK_BYTES,
+        # Assets already upload in parallel on the output pool; cap parts per asset
+        max_concurrency=4,
+        use_threads=True,
+    )
+    return s3_client, transfer_config
+
 
 class OutputProcessor:
     """Handle retrieval and serialization of ComfyUI workflow assets."""
@@ -20,8 +63,13 @@ class OutputProcessor:
     def process(self, outputs: Dict[str, Any], job_id: str) -> Dict[str, List[Dict[str, str]]]:
         result: Dict[str, List[Dict[str, str]]] = {"images": [], "videos": []}
 
-        for node_output in outputs.values():
-            self._collect_assets(node_output, result, job_id)
+        assets = [asset for node_output in outputs.values() for asset in self._iter_assets(node_output)]
+        if assets:
+            upload_to_s3 = bool(os.environ.get("BUCKET_ENDPOINT_URL"))
+            # Fetches and uploads are network-bound, so threads overlap them; map keeps output order
+            entries = _output_executor().map(lambda asset: self._materialize(asset, job_id, upload_to_s3), assets)
+            for asset, entry in zip(assets, entries):
+                result[asset[0]].append(entry)
 
         total_assets = len(result["images"]) + len(result["videos"])
         logging.info(
@@ -32,15 +80,9 @@ class OutputProcessor:
         )
         return result
 
-    def _collect_assets(
-        self,
-        node_output: Dict[str, Any],
-        buckets: Dict[str, List[Dict[str, str]]],
-        job_id: str,
-    ) -> None:
-        collections = {key: node_output.get(key, []) for key in ("images", "videos", "gifs")}
-
-        for entries in collections.values():
+    def _iter_assets(self, node_output: Dict[str, Any]) -> Iterator[Asset]:
+        for key in ("images", "videos", "gifs"):
+            entries = node_output.get(key, [])
             if not isinstance(entries, list):
                 continue
 
@@ -56,30 +98,27 @@ class OutputProcessor:
                 if asset_type == "temp" and bucket_key != "videos":
                     continue
 
-                asset_bytes = self._fetch_asset_bytes(filename, subfolder, asset_type, bucket_key)
-
-                if os.environ.get("BUCKET_ENDPOINT_URL"):
-                    buckets[bucket_key].append({
-                        "filename": filename,
-                        "type": "s3_url",
-                        "data": self._upload_to_s3(asset_bytes, filename, job_id),
-                    })
-                else:
-                    buckets[bucket_key].append({
-                        "filename": filename,
-                        "type": "base64",
-                        "data": base64.b64encode(asset_bytes).decode("utf-8"),
-                    })
-
-    def _fetch_asset_bytes(
-        self,
-        filename: str,
-        subfolder: str,
-        asset_type: str,
-        bucket_key: str,
-    ) -> bytes:
+                yield bucket_key, filename, subfolder, asset_type
+
+    def _materialize(self, asset: Asset, job_id: str, upload_to_s3: bool) -> Dict[str, str]:
+        _, filename, subfolder, _ = asset
+        if upload_to_s3:
+            return {"filename": filename, "type": "s3_url", "data": self._upload_to_s3(asset, job_id)}
+
+        asset_bytes = self._fetch_with_fallback(
+            asset,
+            lambda file_type: self._client.get_output_file_data(filename, subfolder, file_type),
+        )
+        return {
+            "filename": filename,
+            "type": "base64",
+            "data": b64encode_str(asset_bytes),
+        }
+
+    def _fetch_with_fallback(self, asset: Asset, fetch: Callable[[str], T]) -> T:
         """Fetch the asset data from ComfyUI, retrying common mismatches for temp videos."""
 
+        bucket_key, filename, _, asset_type = asset
         preferred_types = [asset_type]
         if asset_type == "temp" and bucket_key == "videos":
             preferred_types = ["output", "temp"]
@@ -87,7 +126,7 @@ class OutputProcessor:
         last_error: Exception | None = None
         for file_type in preferred_types:
             try:
-                return self._client.get_output_file_data(filename, subfolder, file_type)
+                return fetch(file_type)
             except Exception as exc:  # pragma: no cover - network/filesystem dependent
                 last_error = exc
 
@@ -95,27 +134,45 @@ class OutputProcessor:
 
     @staticmethod
     def _resolve_bucket(filename: str) -> str:
-        _, ext = os.path.splitext(filename.lower())
-        if ext in {".mp4", ".mov", ".webm", ".mkv", ".avi"}:
-            return "videos"
-        return "images"
+        return "videos" if filename.lower().endswith(_VIDEO_EXTENSIONS) else "images"
 
-    def _upload_to_s3(self, data: bytes, filename: str, job_id: str) -> str:
+    def _upload_to_s3(self, asset: Asset, job_id: str) -> str:
         try:
             from runpod.serverless.utils import rp_upload
         except ImportError as exc:  # pragma: no cover - optional dependency
             raise RuntimeError("RunPod upload utility is not available") from exc
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1] or ".bin") as temp_file:
-            temp_file.write(data)
-            temp_path = temp_file.name
-
-        try:
-            s3_url = rp_upload.upload_image(job_id, temp_path)
-            logging.info("Uploaded %s to S3: %s", filename, s3_url)
-            return s3_url
-        finally:
-            os.unlink(temp_path)
+        _, filename, subfolder, _ = asset
+        extension = os.path.splitext(filename)[1] or ".bin"
+        object_name = f"{secrets.token_hex(4)}{extension}"
+
+        s3_client, transfer_config = _s3_client()
+        if s3_client is None:
+            # No bucket credentials: let rp_upload apply its local-storage fallback
+            data = self._fetch_with_fallback(
+                asset,
+                lambda file_type: self._client.get_output_file_data(filename, subfolder, file_type),
+            )
+            return rp_upload.upload_in_memory_object(object_name, data, prefix=job_id)
+
+        # Same bucket/key layout as rp_upload.upload_image, but the /view response is
+        # streamed straight into a multipart upload instead of round-tripping through disk
+        bucket = time.strftime("%m-%y")
+        key = f"{job_id}/{object_name}"
+        extra_args = {"ContentType": mimetypes.guess_type(filename)[0] or "application/octet-stream"}
+
+        def _stream(file_type: str) -> None:
+            with self._client.open_output_stream(filename, subfolder, file_type) as stream:
+                s3_client.upload_fileobj(stream, bucket, key, ExtraArgs=extra_args, Config=transfer_config)
+
+        self._fetch_with_fallback(asset, _stream)
+        s3_url = s3_client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket, "Key": key},
+            ExpiresIn=S3_PRESIGNED_URL_TTL_S,
+        )
+        logging.info("Uploaded %s to S3: %s", filename, s3_url)
+        return s3_url
 
     def get_output_summary(self, outputs: Dict[str, Any]) -> str:
         image_count = sum(len(node.get("images", [])) for node in outputs.values())
@@ -3,52 +3,131 @@ from __future__ import annotations
 
 import logging
 import os
-from typing import Dict, Optional
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 
 from logging_utils import log_with_job
 
 
+_BYTES_PER_GB = 1024 * 1024 * 1024
+_KB_PER_GB = 1024 * 1024
+_MEMINFO_FIELDS = ((b"MemTotal:", "total"), (b"MemAvailable:", "available"), (b"MemFree:", "free"))
+
+
+_open_fds: Dict[str, int] = {}
+
+
+def _read_small(path: str) -> bytes:
+    """Read a small procfs/cgroupfs file with a single pread() call.
+
+    The descriptor stays open for the life of the process; these files regenerate
+    their contents on every read from offset 0, so later reads skip open/close.
+    """
+    fd = _open_fds.get(path)
+    if fd is None:
+        fd = _open_fds[path] = os.open(path, os.O_RDONLY)
+    return os.pread(fd, 8192, 0)
+
+
+def _first_existing(*candidates: Tuple[str, ...]) -> Optional[Tuple[str, ...]]:
+    """Return the first group of paths that all exist, or None."""
+    for paths in candidates:
+        if all(os.path.exists(path) for path in paths):
+            return paths
+    return None
+
+
+# The cgroup layout is fixed for the life of the container, so resolve it once at import.
+# Memory paths are (limit file, usage file, stat file), cgroup v2 first, then v1.
+_MEMORY_CGROUP_PATHS = _first_existing(
+    ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current", "/sys/fs/cgroup/memory.stat"),
+    (
+        "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+        "/sys/fs/cgroup/memory/memory.usage_in_bytes",
+        "/sys/fs/cgroup/memory/memory.stat",
+    ),
+)
+# Reclaimable page cache counted in usage; v1 needs the hierarchical total
+_INACTIVE_FILE_KEY = (
+    b"inactive_file"
+    if _MEMORY_CGROUP_PATHS is not None and _MEMORY_CGROUP_PATHS[0].endswith("memory.max")
+    else b"total_inactive_file"
+)
+_CPU_V2_PATHS = _first_existing(("/sys/fs/cgroup/cpu.max", "/sys/fs/cgroup/cpu.stat"))
+_CPU_V1_PATHS = _first_existing(("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "/sys/fs/cgroup/cpu/cpu.cfs_period_us"))
+
+
+def _stat_field(stat: bytes, key: bytes) -> int:
+    """Return the value of a ``key value`` line from a cgroup stat file, or 0 when absent."""
+    start = stat.find(b"\n" + key + b" ")
+    if start < 0:
+        if not stat.startswith(key + b" "):
+            return 0
+        start = 0
+    else:
+        start += 1
+    end = stat.find(b"\n", start)
+    return int(stat[start + len(key):end if end >= 0 else None])
+
+
+@lru_cache(maxsize=1)
+def _memory_limit_bytes() -> Optional[int]:
+    """Return the container memory limit in bytes, or None when unlimited or unknown."""
+    if _MEMORY_CGROUP_PATHS is None:
+        return None
+    limit_value = _read_small(_MEMORY_CGROUP_PATHS[0]).strip()
+    # cgroup v2 reports "max" and v1 a near-2**63 sentinel when unlimited
+    if limit_value == b"max" or int(limit_value) >= 2**63 - 4096:
+        return None
+    return int(limit_value)
+
+
+@lru_cache(maxsize=1)
+def _cpu_limit() -> float:
+    """Return the container CPU quota in cores, falling back to the host CPU count."""
+    host_cpus = float(os.cpu_count() or 0)
+    if _CPU_V2_PATHS is not None:
+        cpu_max = _read_small(_CPU_V2_PATHS[0]).split()
+        if cpu_max[0] != b"max":
+            return int(cpu_max[0]) / int(cpu_max[1])
+    elif _CPU_V1_PATHS is not None:
+        quota = int(_read_small(_CPU_V1_PATHS[0]))
+        if quota > 0:
+            return quota / int(_read_small(_CPU_V1_PATHS[1]))
+    return host_cpus
+
+
 def get_container_memory_info(job_id: Optional[str] = None) -> Dict[str, float]:
     """Return memory statistics in gigabytes gathered from cgroups or host."""
     try:
         mem_info: Dict[str, float] = {}
 
         try:
-            with open("/proc/meminfo", "r", encoding="utf-8") as meminfo_file:
-                meminfo_lines = meminfo_file.readlines()
-
-            for line in meminfo_lines:
-                if "MemTotal:" in line:
-                    mem_info["total"] = int(line.split()[1]) / (1024 * 1024)
-                elif "MemAvailable:" in line:
-                    mem_info["available"] = int(line.split()[1]) / (1024 * 1024)
-                elif "MemFree:" in line:
-                    mem_info["free"] = int(line.split()[1]) / (1024 * 1024)
+            meminfo = _read_small("/proc/meminfo")
+            for key, field in _MEMINFO_FIELDS:
+                start = meminfo.find(key)
+                if start < 0:
+                    continue
+                end = meminfo.find(b"\n", start)
+                mem_info[field] = int(meminfo[start + len(key):end].split()[0]) / _KB_PER_GB
 
             if "total" in mem_info and "free" in mem_info:
                 mem_info["used"] = mem_info["total"] - mem_info["free"]
         except Exception as exc:
             log_with_job(logging.warning, f"Failed to read host memory info: {exc}", job_id)
 
-        try:
-            with open("/sys/fs/cgroup/memory.max", "r", encoding="utf-8") as max_file:
-                max_value = max_file.read().strip()
-                if max_value != "max":
-                    mem_info["limit"] = int(max_value) / (1024 * 1024 * 1024)
-
-            with open("/sys/fs/cgroup/memory.current", "r", encoding="utf-8") as current_file:
-                mem_info["used"] = int(current_file.read().strip()) / (1024 * 1024 * 1024)
-        except FileNotFoundError:
-            try:
-                with open("/sys/fs/cgroup/memory/memory.limit_in_bytes", "r", encoding="utf-8") as limit_file:
-                    mem_limit = int(limit_file.read().strip())
-                    if mem_limit < 2**63:
-                        mem_info["limit"] = mem_limit / (1024 * 1024 * 1024)
-
-                with open("/sys/fs/cgroup/memory/memory.usage_in_bytes", "r", encoding="utf-8") as usage_file:
-                    mem_info["used"] = int(usage_file.read().strip()) / (1024 * 1024 * 1024)
-            except FileNotFoundError:
-                pass
+        if _MEMORY_CGROUP_PATHS is not None:
+            used_bytes = int(_read_small(_MEMORY_CGROUP_PATHS[1]))
+            mem_info["used"] = used_bytes / _BYTES_PER_GB
+
+            # /proc/meminfo describes the host; inside a limited cgroup the headroom is
+            # the limit minus the working set (usage without reclaimable page cache)
+            limit_bytes = _memory_limit_bytes()
+            if limit_bytes is not None:
+                inactive_file = _stat_field(_read_small(_MEMORY_CGROUP_PATHS[2]), _INACTIVE_FILE_KEY)
+                working_set = max(0, used_bytes - inactive_file)
+                mem_info["limit"] = limit_bytes / _BYTES_PER_GB
+                mem_info["available"] = max(0, limit_bytes - working_set) / _BYTES_PER_GB
 
         return mem_info
     except Exception as exc:
@@ -59,34 +138,13 @@ def get_container_memory_info(job_id: Optional[str] = None) -> Dict[str, float]:
 def get_container_cpu_info(job_id: Optional[str] = None) -> Dict[str, float]:
     """Return CPU quota details derived from cgroups, falling back to host values."""
     try:
-        cpu_info: Dict[str, float] = {}
+        cpu_info: Dict[str, float] = {"limit": _cpu_limit()}
 
-        try:
-            with open("/sys/fs/cgroup/cpu.max", "r", encoding="utf-8") as cpu_max_file:
-                cpu_max = cpu_max_file.read().strip()
-                if cpu_max != "max":
-                    quota, period = cpu_max.split()
-                    cpu_info["limit"] = int(quota) / int(period)
-                else:
-                    cpu_info["limit"] = os.cpu_count() or 0
-
-            with open("/sys/fs/cgroup/cpu.stat", "r", encoding="utf-8") as cpu_stat_file:
-                for line in cpu_stat_file:
-                    if line.startswith("usage_usec "):
-                        cpu_info["usage_usec"] = int(line.split()[1])
-                        break
-        except FileNotFoundError:
-            try:
-                with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "r", encoding="utf-8") as quota_file:
-                    quota = int(quota_file.read().strip())
-                    if quota > 0:
-                        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", "r", encoding="utf-8") as period_file:
-                            period = int(period_file.read().strip())
-                            cpu_info["limit"] = quota / period
-                    else:
-                        cpu_info["limit"] = os.cpu_count() or 0
-            except FileNotFoundError:
-                cpu_info["limit"] = os.cpu_count() or 0
+        if _CPU_V2_PATHS is not None:
+            cpu_stat = _read_small(_CPU_V2_PATHS[1])
+            start = cpu_stat.find(b"usage_usec ")
+            if start >= 0:
+                cpu_info["usage_usec"] = int(cpu_stat[start:cpu_stat.find(b"\n", start)].split()[1])
 
         return cpu_info
     except Exception as exc:
@@ -1,18 +1,19 @@
 """Utilities for preparing ComfyUI workflows."""
 from __future__ import annotations
 
-import base64
-import json
+import hashlib
 import logging
 import os
-import tempfile
-import uuid
+import secrets
+from functools import lru_cache
 from io import BytesIO
-from typing import Any, Dict, TYPE_CHECKING
+from typing import Any, Callable, Dict, FrozenSet, Tuple, TYPE_CHECKING
 
+import orjson
 from PIL import Image
 import yaml
 
+from base64_codec import b64decode
 from logging_utils import log_with_job
 
 if TYPE_CHECKING:
@@ -40,6 +41,9 @@ STYLES_YAML_PATH = os.path.join(
     "z-image-photo-styles.yaml",
 )
 
+# id(template) -> (template, placeholders); the template is kept for an identity check
+_TEMPLATE_PLACEHOLDERS: Dict[int, Tuple[Dict[str, Any], FrozenSet[str]]] = {}
+
 
 def load_image_style_prompts() -> Dict[str, str]:
     """Load image style prompts from the YAML file.
@@ -79,29 +83,60 @@ def resolve_image_style_prompt(image_style: str) -> str:
 
 def workflow_requires_token(workflow: Dict[str, Any], token: str) -> bool:
     """Return True when the workflow template contains the given placeholder token."""
+    return token in workflow_placeholders(workflow)
 
-    def _contains(value: Any) -> bool:
-        if isinstance(value, dict):
-            return any(_contains(item) for item in value.values())
-        if isinstance(value, list):
-            return any(_contains(item) for item in value)
-        return value == token
 
-    return _contains(workflow)
+def workflow_placeholders(workflow: Dict[str, Any]) -> FrozenSet[str]:
+    """Return every ``{{ ... }}`` placeholder value in the workflow.
+
+    Cached templates have theirs collected once at load time, so the per-job
+    ``workflow_requires_*`` checks don't each walk the whole node graph.
+    """
+    cached = _TEMPLATE_PLACEHOLDERS.get(id(workflow))
+    # An id can be reused once a template is evicted, so only trust the same object
+    if cached is not None and cached[0] is workflow:
+        return cached[1]
+    return _collect_placeholders(workflow)
+
+
+def _collect_placeholders(workflow: Dict[str, Any]) -> FrozenSet[str]:
+    found = set()
+    stack = [workflow]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, str) and value.startswith("{{"):
+            found.add(value)
+    return frozenset(found)
 
 
 def load_workflow_template(workflow_name: str) -> Dict[str, Any]:
-    """Load a workflow template from disk."""
+    """Load a workflow template, parsing each template file only once per process.
+
+    The returned dict is shared between jobs and must be treated as read-only;
+    ``prepare_workflow`` builds a fresh tree before applying per-job values.
+    """
     template_file = WORKFLOW_TEMPLATES.get(workflow_name, WORKFLOW_TEMPLATES["video_wan2_2_14B_i2v"])
+    return _load_template_file(template_file)
+
+
+@lru_cache(maxsize=None)
+def _load_template_file(template_file: str) -> Dict[str, Any]:
     template_path = os.path.join(os.path.dirname(__file__), "..", "workflows", template_file)
     try:
-        with open(template_path, "r", encoding="utf-8") as template_handle:
-            return json.load(template_handle)
+        with open(template_path, "rb") as template_handle:
+            template = orjson.loads(template_handle.read())
     except FileNotFoundError as exc:
         raise FileNotFoundError(f"Workflow template not found at {template_path}") from exc
-    except json.JSONDecodeError as exc:
+    except orjson.JSONDecodeError as exc:
         raise ValueError(f"Invalid JSON in workflow template: {exc}") from exc
 
+    _TEMPLATE_PLACEHOLDERS[id(template)] = (template, _collect_placeholders(template))
+    return template
+
 
 def workflow_requires_input_image(workflow: Dict[str, Any]) -> bool:
     """Return True when the workflow template includes an input image placeholder."""
@@ -133,6 +168,18 @@ def workflow_requires_prompt(workflow: Dict[str, Any]) -> bool:
     return any(workflow_requires_token(workflow, token) for token in prompt_tokens)
 
 
+def _decode_data_uri(data_uri: str) -> Tuple[str, bytes]:
+    """Split an optional ``data:...;base64,`` header off a payload and decode the rest.
+
+    Decoding from a memoryview over the ASCII bytes copies the (often multi-megabyte)
+    base64 text once, instead of slicing the string and re-encoding the slice.
+    """
+    raw = data_uri.encode("ascii")
+    comma = raw.find(b",")
+    header = raw[:comma].decode("ascii") if comma >= 0 else ""
+    return header, b64decode(memoryview(raw)[comma + 1:])
+
+
 def upload_input_image(
     image_data_uri: str,
     job_id: str,
@@ -142,31 +189,64 @@ def upload_input_image(
 ) -> str:
     """Decode and upload the input image to ComfyUI, returning the filename."""
     try:
-        base64_data = image_data_uri.split(",", 1)[1] if "," in image_data_uri else image_data_uri
-        blob = base64.b64decode(base64_data)
-        image = Image.open(BytesIO(blob)).convert("RGB")
+        _, blob = _decode_data_uri(image_data_uri)
+        image = Image.open(BytesIO(blob))
+        source_width, source_height = image.size
+        if _can_upload_verbatim(image, width, height):
+            image.load()
+            return _upload_image_bytes(blob, image.format, client, job_id)
+        # JPEG decoders can downscale by 1/2..1/8 during the DCT; draft picks the largest
+        # reduction that still covers the target size (a no-op for other formats)
+        image.draft("RGB", (width, height))
+        image = image.convert("RGB")
     except Exception as exc:
         raise ValueError(f"Invalid base64 image data: {exc}") from exc
 
-    if image.size != (width, height):
+    # A couple of pixels off is not worth a resample; the workflow nodes carry the target size
+    if abs(image.size[0] - width) > 2 or abs(image.size[1] - height) > 2:
         log_with_job(
             logging.info,
-            f"Resizing input image from {image.size[0]}x{image.size[1]} to {width}x{height}",
+            f"Resizing input image from {source_width}x{source_height} to {width}x{height}",
             job_id,
         )
-        image = image.resize((width, height), Image.LANCZOS)
+        # The model VAE-encodes and noises this frame, so LANCZOS quality is wasted here
+        # reducing_gap lets Pillow box-reduce by an integer factor before the filter pass
+        image = image.resize((width, height), Image.BILINEAR, reducing_gap=3.0)
 
-    filename = f"{uuid.uuid4()}.png"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-        image.save(temp_file, format="PNG")
-        temp_file_path = temp_file.name
+    buffer = BytesIO()
+    # The file only crosses localhost to ComfyUI, so favour encode speed over size
+    image.save(buffer, format="PNG", compress_level=0)
+    return _upload_image_bytes(buffer.getvalue(), "PNG", client, job_id)
 
-    try:
-        client.upload_image(filename, temp_file_path)
-        log_with_job(logging.info, f"Successfully uploaded image as {filename}", job_id)
-        return filename
-    finally:
-        os.unlink(temp_file_path)
+
+_VERBATIM_IMAGE_FORMATS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+_EXIF_ORIENTATION = 0x0112
+
+
+def _can_upload_verbatim(image: Image.Image, width: int, height: int) -> bool:
+    """Return True when the original file would decode to what re-encoding would produce.
+
+    That means a single-frame RGB image ComfyUI loads without rotating, already within
+    the resize tolerance; anything else goes through decode, convert and PNG encode.
+    """
+    return (
+        image.format in _VERBATIM_IMAGE_FORMATS
+        and image.mode == "RGB"
+        # LoadImage turns every frame of an animated WebP/APNG into a batch entry
+        and not getattr(image, "is_animated", False)
+        and abs(image.size[0] - width) <= 2
+        and abs(image.size[1] - height) <= 2
+        and image.getexif().get(_EXIF_ORIENTATION, 1) == 1
+    )
+
+
+def _upload_image_bytes(data: bytes, image_format: str, client: "ComfyClient", job_id: str) -> str:
+    # Content-addressed name: a re-sent image overwrites its earlier upload instead of adding a file
+    extension = _VERBATIM_IMAGE_FORMATS[image_format]
+    filename = f"{hashlib.blake2b(data, digest_size=12).hexdigest()}{extension}"
+    client.upload_image(filename, data, Image.MIME[image_format])
+    log_with_job(logging.info, f"Successfully uploaded image as {filename}", job_id)
+    return filename
 
 
 def upload_input_video(
@@ -177,12 +257,9 @@ def upload_input_video(
     """Decode and upload a base64-encoded video to ComfyUI, returning the filename."""
     try:
         mime_type = "video/mp4"
-        payload = video_data_uri
-        if video_data_uri.startswith("data:") and "," in video_data_uri:
-            header, payload = video_data_uri.split(",", 1)
+        header, blob = _decode_data_uri(video_data_uri)
+        if header.startswith("data:"):
             mime_type = header.split(";", 1)[0].replace("data:", "") or mime_type
-
-        blob = base64.b64decode(payload)
     except Exception as exc:
         raise ValueError(f"Invalid base64 video data: {exc}") from exc
 
@@ -194,17 +271,10 @@ def upload_input_video(
     }
     suffix = ext_by_mime.get(mime_type, ".mp4")
 
-    filename = f"{uuid.uuid4()}{suffix}"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-        temp_file.write(blob)
-        temp_file_path = temp_file.name
-
-    try:
-        client.upload_input_file(filename, temp_file_path, mime_type)
-        log_with_job(logging.info, f"Successfully uploaded video as {filename}", job_id)
-        return filename
-    finally:
-        os.unlink(temp_file_path)
+    filename = f"{secrets.token_hex(16)}{suffix}"
+    client.upload_input_file(filename, blob, mime_type)
+    log_with_job(logging.info, f"Successfully uploaded video as {filename}", job_id)
+    return filename
 
 
 def prepare_workflow(
@@ -222,8 +292,7 @@ def prepare_workflow(
     image_style_prompt: str | None = None,
 ) -> Dict[str, Any]:
     """Prepare a workflow by injecting prompt, image, dimensions, and unique filenames."""
-    workflow = substitute_workflow_placeholders(
-        workflow,
+    replace = _placeholder_replacer(
         prompt,
         image_filename,
         width,
@@ -235,13 +304,29 @@ def prepare_workflow(
         image_style_prompt=image_style_prompt,
     )
 
+    # One pass copies each node with placeholders filled in, then patches the copy:
+    # dimension nodes are remembered and save nodes get unique filename prefixes
+    prepared: Dict[str, Any] = {}
+    wan_node: Dict[str, Any] | None = None
+    latent_node: Dict[str, Any] | None = None
+    for node_id, template_node in workflow.items():
+        node = prepared[node_id] = replace(template_node)
+        if not isinstance(node, dict):
+            continue
+        class_type = node.get("class_type")
+        if class_type in _FILENAME_PREFIX_NODES:
+            _set_unique_filename_prefix(node)
+        elif class_type == "WanImageToVideo" and wan_node is None:
+            wan_node = node
+        elif class_type == "EmptySD3LatentImage" and latent_node is None:
+            latent_node = node
+
     try:
-        set_workflow_dimensions(workflow, width, height, length)
+        _apply_dimensions(wan_node, latent_node, width, height, length)
     except ValueError as exc:
         log_with_job(logging.debug, f"Skipping dimension override: {exc}", job_id)
 
-    create_unique_filename_prefix(workflow)
-    return workflow
+    return prepared
 
 
 def substitute_workflow_placeholders(
@@ -257,69 +342,111 @@ def substitute_workflow_placeholders(
     image_style_prompt: str | None = None,
 ) -> Dict[str, Any]:
     """Replace placeholder tokens within the workflow template."""
+    replace = _placeholder_replacer(
+        prompt,
+        image_filename,
+        width,
+        height,
+        video_filename=video_filename,
+        frame_rate=frame_rate,
+        output_resolution=output_resolution,
+        batch_size=batch_size,
+        image_style_prompt=image_style_prompt,
+    )
+    return replace(workflow)
+
+
+def _placeholder_replacer(
+    prompt: str,
+    image_filename: str,
+    width: int,
+    height: int,
+    video_filename: str = "",
+    frame_rate: int | None = None,
+    output_resolution: int | None = None,
+    batch_size: int | None = None,
+    image_style_prompt: str | None = None,
+) -> Callable[[Any], Any]:
+    replacements: Dict[str, Any] = {
+        "{{ VIDEO_PROMPT }}": prompt,
+        "{{ POSITIVE_PROMPT }}": prompt,
+        "{{ IMAGE_PROMPT }}": prompt,
+        "{{ INPUT_IMAGE }}": image_filename,
+        "{{ IMAGE_WIDTH }}": width,
+        "{{ IMAGE_HEIGHT }}": height,
+        "{{ INPUT_VIDEO }}": video_filename,
+    }
+    # Optional values leave their placeholder untouched when not provided
+    optional = {
+        "{{ FRAME_RATE }}": frame_rate,
+        "{{ OUTPUT_RESOLUTION }}": output_resolution,
+        "{{ BATCH_SIZE }}": batch_size,
+        "{{ IMAGE_STYLE_PROMPT }}": image_style_prompt,
+    }
+    replacements.update((token, value) for token, value in optional.items() if value is not None)
 
     def _replace(value: Any) -> Any:
+        if isinstance(value, str):
+            # Placeholders are whole string values, so one dict lookup per leaf suffices
+            return replacements.get(value, value) if value.startswith("{{") else value
         if isinstance(value, dict):
             return {key: _replace(item) for key, item in value.items()}
         if isinstance(value, list):
             return [_replace(item) for item in value]
-        if value == "{{ VIDEO_PROMPT }}":
-            return prompt
-        if value == "{{ POSITIVE_PROMPT }}":
-            return prompt
-        if value == "{{ INPUT_IMAGE }}":
-            return image_filename
-        if value == "{{ IMAGE_WIDTH }}":
-            return width
-        if value == "{{ IMAGE_HEIGHT }}":
-            return height
-        if value == "{{ INPUT_VIDEO }}":
-            return video_filename
-        if value == "{{ FRAME_RATE }}":
-            return frame_rate if frame_rate is not None else value
-        if value == "{{ OUTPUT_RESOLUTION }}":
-            return output_resolution if output_resolution is not None else value
-        if value == "{{ BATCH_SIZE }}":
-            return batch_size if batch_size is not None else value
-        if value == "{{ IMAGE_STYLE_PROMPT }}":
-            return image_style_prompt if image_style_prompt is not None else value
         return value
 
-    return _replace(workflow)
+    return _replace
 
 
 def set_workflow_dimensions(workflow: Dict[str, Any], width: int, height: int, length: int) -> None:
     """Apply dimension overrides to WanImageToVideo nodes."""
-    for node in workflow.values():
-        if isinstance(node, dict) and node.get("class_type") == "WanImageToVideo":
-            inputs = node.setdefault("inputs", {})
-            inputs["width"] = width
-            inputs["height"] = height
-            inputs["length"] = length
-            log_with_job(logging.info, f"Set workflow dimensions: {width}x{height}, length={length}", None)
-            return
+    nodes = [node for node in workflow.values() if isinstance(node, dict)]
+    wan_node = next((node for node in nodes if node.get("class_type") == "WanImageToVideo"), None)
+    latent_node = next((node for node in nodes if node.get("class_type") == "EmptySD3LatentImage"), None)
+    _apply_dimensions(wan_node, latent_node, width, height, length)
 
-    for node in workflow.values():
-        if isinstance(node, dict) and node.get("class_type") == "EmptySD3LatentImage":
-            inputs = node.setdefault("inputs", {})
-            inputs["width"] = width
-            inputs["height"] = height
-            log_with_job(logging.info, f"Set workflow dimensions: {width}x{height}", None)
-            return
+
+def _apply_dimensions(
+    wan_node: Dict[str, Any] | None,
+    latent_node: Dict[str, Any] | None,
+    width: int,
+    height: int,
+    length: int,
+) -> None:
+    if wan_node is not None:
+        inputs = wan_node.setdefault("inputs", {})
+        inputs["width"] = width
+        inputs["height"] = height
+        inputs["length"] = length
+        log_with_job(logging.info, f"Set workflow dimensions: {width}x{height}, length={length}", None)
+        return
+
+    if latent_node is not None:
+        inputs = latent_node.setdefault("inputs", {})
+        inputs["width"] = width
+        inputs["height"] = height
+        log_with_job(logging.info, f"Set workflow dimensions: {width}x{height}", None)
+        return
 
     raise ValueError("No supported dimension nodes found in workflow template")
 
 
+_FILENAME_PREFIX_NODES = frozenset({"SaveImage", "VHS_VideoCombine"})
+
+
 def create_unique_filename_prefix(workflow: Dict[str, Any]) -> None:
     """Ensure SaveImage nodes use unique filename prefixes to avoid collisions."""
     for node in workflow.values():
-        if isinstance(node, dict) and node.get("class_type") == "SaveImage":
-            inputs = node.setdefault("inputs", {})
-            inputs["filename_prefix"] = str(uuid.uuid4())
+        if isinstance(node, dict) and node.get("class_type") in _FILENAME_PREFIX_NODES:
+            _set_unique_filename_prefix(node)
 
-    for node in workflow.values():
-        if isinstance(node, dict) and node.get("class_type") == "VHS_VideoCombine":
-            inputs = node.setdefault("inputs", {})
-            prefix = inputs.get("filename_prefix")
-            unique = str(uuid.uuid4())
-            inputs["filename_prefix"] = f"{prefix}_{unique}" if prefix else unique
+
+def _set_unique_filename_prefix(node: Dict[str, Any]) -> None:
+    inputs = node.setdefault("inputs", {})
+    if node.get("class_type") == "SaveImage":
+        inputs["filename_prefix"] = secrets.token_hex(16)
+        return
+
+    prefix = inputs.get("filename_prefix")
+    unique = secrets.token_hex(16)
+    inputs["filename_prefix"] = f"{prefix}_{unique}" if prefix else unique
@@ -1,12 +1,16 @@
 from __future__ import annotations
 
-import base64
 import json
 from io import BytesIO
 from pathlib import Path
 
 from PIL import Image
 
+try:
+    from pybase64 import b64decode
+except ModuleNotFoundError:
+    from base64 import b64decode
+
 
 def main() -> None:
     input_path = Path("./qwen-output.json")
@@ -15,7 +19,7 @@ def main() -> None:
     payload = json.loads(input_path.read_text(encoding="utf-8"))
 
     b64_data = payload["output"]["output"]["images"][0]["data"]
-    img_bytes = base64.b64decode(b64_data)
+    img_bytes = b64decode(b64_data)
 
     img = Image.open(BytesIO(img_bytes)).convert("RGB")
     img.save(output_path, format="JPEG", quality=95)
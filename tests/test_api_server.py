@@ -0,0 +1,151 @@
+"""Unit tests for the local API server's prompt tracking and request validation."""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, List
+
+import httpx
+import orjson
+import pytest
+from pydantic import ValidationError
+
+import api_server
+
+
+def _terminal_event(prompt_id: str) -> Dict[str, Any]:
+    return {"type": "executing", "data": {"node": None, "prompt_id": prompt_id}}
+
+
+@pytest.fixture
+def history_requests(monkeypatch) -> List[str]:
+    """Reset prompt tracking state and serve /history from a mock transport."""
+    requested: List[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        prompt_id = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(200, content=orjson.dumps({prompt_id: {"outputs": {"9": {"images": []}}}}))
+
+    monkeypatch.setattr(api_server, "pending_prompts", {})
+    monkeypatch.setattr(api_server, "unclaimed_prompt_events", api_server.OrderedDict())
+    monkeypatch.setattr(api_server, "monitor_tasks", set())
+    monkeypatch.setattr(
+        api_server,
+        "comfy_http",
+        httpx.AsyncClient(base_url=api_server.COMFY_API_BASE, transport=httpx.MockTransport(handler)),
+    )
+    return requested
+
+
+def test_event_before_register_prompt_resolves_from_history(history_requests) -> None:
+    async def scenario() -> Dict[str, Any]:
+        api_server._dispatch_ws_message(_terminal_event("early"))
+        assert "early" in api_server.unclaimed_prompt_events
+
+        future = api_server.register_prompt("early")
+        return await asyncio.wait_for(future, timeout=1)
+
+    result = asyncio.run(scenario())
+
+    assert result == {"outputs": {"9": {"images": []}}}
+    assert history_requests == ["/history/early"]
+    assert not api_server.unclaimed_prompt_events
+    assert not api_server.pending_prompts
+
+
+def test_execution_error_event_resolves_to_error_without_history(history_requests) -> None:
+    async def scenario() -> Dict[str, Any]:
+        future = api_server.register_prompt("broken")
+        api_server._dispatch_ws_message({
+            "type": "execution_error",
+            "data": {
+                "prompt_id": "broken",
+                "node_type": "KSampler",
+                "node_id": "3",
+                "exception_message": "out of memory",
+            },
+        })
+        return await asyncio.wait_for(future, timeout=1)
+
+    result = asyncio.run(scenario())
+
+    assert result == {
+        "error": "ComfyUI execution error: Node Type: KSampler, Node ID: 3, Message: out of memory"
+    }
+    assert history_requests == []
+
+
+def test_unclaimed_events_evict_oldest_beyond_limit(history_requests, monkeypatch) -> None:
+    monkeypatch.setattr(api_server, "UNCLAIMED_EVENTS_MAX", 2)
+
+    for prompt_id in ("first", "second", "third"):
+        api_server._dispatch_ws_message(_terminal_event(prompt_id))
+
+    assert list(api_server.unclaimed_prompt_events) == ["second", "third"]
+
+
+def test_non_terminal_events_are_not_buffered(history_requests) -> None:
+    api_server._dispatch_ws_message({"type": "executing", "data": {"node": "5", "prompt_id": "busy"}})
+    api_server._dispatch_ws_message({"type": "progress", "data": {"value": 1, "prompt_id": "busy"}})
+
+    assert not api_server.unclaimed_prompt_events
+
+
+def test_wait_for_prompt_falls_back_to_history_on_timeout(history_requests, monkeypatch) -> None:
+    monkeypatch.setattr(api_server, "MONITOR_TIMEOUT_S", 0.01)
+
+    async def scenario() -> Dict[str, Any]:
+        future = api_server.register_prompt("silent")
+        return await api_server.wait_for_prompt("silent", future)
+
+    result = asyncio.run(scenario())
+
+    assert result == {"outputs": {"9": {"images": []}}}
+    assert "silent" not in api_server.pending_prompts
+
+
+def test_resolution_after_waiter_timeout_does_not_fail(monkeypatch) -> None:
+    history_started = None
+    release_history = None
+
+    async def slow_history(prompt_id: str) -> Dict[str, Any]:
+        history_started.set()
+        await release_history.wait()
+        return {"outputs": {}}
+
+    monkeypatch.setattr(api_server, "pending_prompts", {})
+    monkeypatch.setattr(api_server, "monitor_tasks", set())
+    monkeypatch.setattr(api_server, "fetch_prompt_history", slow_history)
+
+    async def scenario() -> None:
+        nonlocal history_started, release_history
+        history_started, release_history = asyncio.Event(), asyncio.Event()
+        future = api_server.register_prompt("late")
+        api_server._dispatch_ws_message(_terminal_event("late"))
+        await history_started.wait()
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(future, timeout=0.01)
+        assert future.cancelled()
+
+        (task,) = api_server.monitor_tasks
+        release_history.set()
+        await task
+        assert task.exception() is None
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize(
+    ("body", "detail"),
+    [
+        (b"{", "Invalid JSON: EOF while parsing an object at line 1 column 1"),
+        (b"{}", "'input': Field required"),
+        (b'{"input": {"comfyui_workflow_name": 5}}', "'input.comfyui_workflow_name': Input should be a valid string"),
+    ],
+)
+def test_validation_detail_flattens_pydantic_errors(body: bytes, detail: str) -> None:
+    with pytest.raises(ValidationError) as exc_info:
+        api_server.RunRequest.model_validate_json(body)
+
+    assert api_server._validation_detail(exc_info.value) == detail
@@ -0,0 +1,116 @@
+"""Unit tests for ComfyUI client helpers that do not need a running server."""
+from __future__ import annotations
+
+import io
+from typing import Dict, List
+
+import pytest
+import websocket
+
+import comfy_client
+from comfy_client import ComfyClient
+
+
+class _RecordingStream(io.BytesIO):
+    def __init__(self, data: bytes) -> None:
+        super().__init__(data)
+        self.decode_content = False
+        self.read_sizes: List[int] = []
+
+    def readinto(self, buffer) -> int:
+        self.read_sizes.append(len(buffer))
+        return super().readinto(buffer)
+
+
+class _FakeResponse:
+    def __init__(self, data: bytes, headers: Dict[str, str]) -> None:
+        self.raw = _RecordingStream(data)
+        self.headers = headers
+
+    def __enter__(self) -> "_FakeResponse":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        return None
+
+    def raise_for_status(self) -> None:
+        return None
+
+
+class _FakeWebSocket:
+    def __init__(self, frames: List[object]) -> None:
+        self.connected = True
+        self.connects = 0
+        self.closed = False
+        self.pings = 0
+        self._frames = frames
+
+    def connect(self, url: str, timeout: float) -> None:
+        self.connected = True
+        self.connects += 1
+
+    def settimeout(self, timeout: float) -> None:
+        return None
+
+    def ping(self) -> None:
+        self.pings += 1
+
+    def recv_data(self, control_frame: bool = False):
+        frame = self._frames.pop(0)
+        if isinstance(frame, Exception):
+            raise frame
+        return frame
+
+    def close(self) -> None:
+        self.closed = True
+        self.connected = False
+
+
+def _client_serving(monkeypatch, response: _FakeResponse) -> ComfyClient:
+    client = ComfyClient()
+    monkeypatch.setattr(client.session, "get", lambda *args, **kwargs: response)
+    return client
+
+
+def test_get_output_file_data_reads_sized_body_in_bounded_chunks(monkeypatch) -> None:
+    monkeypatch.setattr(comfy_client, "_READ_CHUNK_BYTES", 4)
+    data = bytes(range(10))
+    response = _FakeResponse(data, {"Content-Length": str(len(data))})
+    client = _client_serving(monkeypatch, response)
+
+    result = client.get_output_file_data("clip.mp4", "", "output")
+
+    assert result == data
+    assert max(response.raw.read_sizes) == 4
+
+
+def test_get_output_file_data_rejects_truncated_sized_body(monkeypatch) -> None:
+    response = _FakeResponse(b"short", {"Content-Length": "10"})
+    client = _client_serving(monkeypatch, response)
+
+    with pytest.raises(IOError, match="Truncated download of clip.mp4: 5/10 bytes"):
+        client.get_output_file_data("clip.mp4", "", "output")
+
+
+def test_connect_websocket_reuses_socket_that_answers_ping() -> None:
+    stale_status = (websocket.ABNF.OPCODE_TEXT, b'{"type": "status"}')
+    ws = _FakeWebSocket([stale_status, (websocket.ABNF.OPCODE_PONG, b"")])
+    client = ComfyClient()
+    client._ws = ws
+
+    assert client.connect_websocket() is ws
+    assert ws.pings == 1
+    assert not ws.closed
+
+
+def test_connect_websocket_replaces_half_open_socket(monkeypatch) -> None:
+    half_open = _FakeWebSocket([websocket.WebSocketTimeoutException("timed out")])
+    fresh = _FakeWebSocket([])
+    fresh.connected = False
+    monkeypatch.setattr(comfy_client.websocket, "WebSocket", lambda **kwargs: fresh)
+    client = ComfyClient()
+    client._ws = half_open
+
+    assert client.connect_websocket() is fresh
+    assert half_open.closed
+    assert fresh.connects == 1
@@ -0,0 +1,144 @@
+"""Unit tests for the queued logging setup."""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+
+import pytest
+
+from logging_utils import DroppingQueueHandler, set_current_job_id
+
+
+@pytest.fixture
+def queued_logger():
+    """Yield a non-propagating logger and detach any handlers the test added to it."""
+    logger = logging.getLogger("test_dropping_queue_handler")
+    logger.propagate = False
+    try:
+        yield logger
+    finally:
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+
+
+def test_dropping_queue_handler_counts_records_it_cannot_enqueue(queued_logger) -> None:
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=1)
+    handler = DroppingQueueHandler(log_queue)
+    queued_logger.addHandler(handler)
+
+    queued_logger.warning("first")
+    queued_logger.warning("second")
+
+    assert handler.dropped == 1
+    assert log_queue.get_nowait().getMessage() == "first"
+
+
+def test_dropping_queue_handler_reports_dropped_bursts(queued_logger, capsys) -> None:
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=2)
+    queued_logger.addHandler(DroppingQueueHandler(log_queue))
+
+    for message in ("first", "second", "third", "fourth"):
+        queued_logger.warning(message)
+    assert capsys.readouterr().err.count("dropping log records") == 1
+
+    log_queue.get_nowait()
+    log_queue.get_nowait()
+    queued_logger.warning("fifth")
+
+    assert log_queue.get_nowait().getMessage() == "2 log records dropped while the log queue was full"
+    assert log_queue.get_nowait().getMessage() == "fifth"
+
+
+def test_dropping_queue_handler_records_job_id() -> None:
+    set_current_job_id("job-123")
+    try:
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+        handler = DroppingQueueHandler(log_queue)
+
+        handler.handle(logging.LogRecord("test", logging.INFO, __file__, 1, "hello %s", ("world",), None))
+
+        record = log_queue.get_nowait()
+        assert record.getMessage() == "hello world"
+        assert record.runpod_job_id == "job-123"
+    finally:
+        set_current_job_id(None)
+
+
+def test_snaplog_handler_posts_full_batches_off_the_calling_thread(monkeypatch) -> None:
+    from logging_utils import SnapLogHandler
+
+    monkeypatch.setenv("LOG_API_ENDPOINT", "http://logs.invalid")
+    monkeypatch.setenv("LOG_API_BATCH_SIZE", "2")
+    handler = SnapLogHandler("test-app")
+    posted = threading.Event()
+    threads = []
+
+    def fake_post(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        posted.set()
+
+    monkeypatch.setattr(handler._session, "post", fake_post)
+    for message in ("one", "two"):
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None)
+        handler._emit_external_log(record, message, None)
+
+    assert posted.wait(2)
+    assert threads == ["snaplog-flush"]
+    handler.close()
+    handler.close()
+
+
+def test_snaplog_handler_truncates_long_runpod_messages(monkeypatch) -> None:
+    from logging_utils import SnapLogHandler
+
+    monkeypatch.delenv("LOG_API_ENDPOINT", raising=False)
+    handler = SnapLogHandler("test-app")
+    sent = []
+    handler._level_loggers[logging.ERROR] = lambda message, *args: sent.append(message)
+
+    handler._emit_runpod_log(logging.ERROR, "x" * 5000, None)
+
+    assert len(sent) == 1
+    assert len(sent[0]) == 1000
+    assert sent[0].endswith("...")
+
+
+def test_websocket_debug_frames_reach_the_file_immediately(monkeypatch, tmp_path) -> None:
+    import logging_utils
+
+    debug_path = tmp_path / "ws.log"
+    monkeypatch.setattr(logging_utils, "WS_DEBUG_FILE", str(debug_path))
+    monkeypatch.setattr(logging_utils, "_ws_debug_file", None)
+
+    logging_utils._write_websocket_debug(b'{"type":"status"}', "job-1")
+
+    assert debug_path.read_bytes().endswith(b'| job_id=job-1 | {"type":"status"}\n')
+    logging_utils._ws_debug_file.close()
+
+
+def test_setup_logging_again_closes_the_previous_handlers(monkeypatch) -> None:
+    import atexit
+
+    import logging_utils
+
+    monkeypatch.setenv("LOG_API_ENDPOINT", "http://logs.invalid")
+    monkeypatch.setattr(logging_utils, "_listener", None)
+    logging_utils.setup_logging("test-setup-logging")
+    first_handlers = logging_utils._listener.handlers
+    snaplog = next(h for h in first_handlers if isinstance(h, logging_utils.SnapLogHandler))
+    posted = []
+    monkeypatch.setattr(snaplog._session, "post", lambda *args, **kwargs: posted.append(kwargs["data"]))
+
+    logging.getLogger("test-setup-logging").warning("buffered before re-setup")
+    logging_utils.setup_logging("test-setup-logging")
+
+    assert snaplog._stopping.is_set()
+    assert not snaplog._flush_thread.is_alive()
+    assert any(b"buffered before re-setup" in body for body in posted)
+
+    atexit.unregister(logging_utils._listener.stop)
+    logging_utils._listener.stop()
+    for handler in logging_utils._listener.handlers:
+        handler.close()
@@ -87,3 +87,18 @@ def test_process_treats_gifs_mp4_as_video() -> None:
 
     assert len(result["videos"]) == 1
     assert result["videos"][0]["filename"] == "seedvr2_upscaled_00001.mp4"
+
+
+def test_process_preserves_asset_order_across_nodes() -> None:
+    client = _StubComfyClient()
+    processor = OutputProcessor(client)  # type: ignore[arg-type]
+
+    outputs: Dict[str, Any] = {
+        "3": {"images": [{"filename": f"frame_{index:05d}.png", "type": "output"} for index in range(6)]},
+        "9": {"videos": [{"filename": "clip.mp4", "type": "output"}]},
+    }
+
+    result = processor.process(outputs, job_id="job")
+
+    assert [image["filename"] for image in result["images"]] == [f"frame_{index:05d}.png" for index in range(6)]
+    assert [video["filename"] for video in result["videos"]] == ["clip.mp4"]
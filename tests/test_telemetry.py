@@ -0,0 +1,85 @@
+"""Unit tests for cgroup-aware container memory telemetry."""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+import telemetry
+
+_GB = 1024 ** 3
+
+
+@pytest.fixture
+def cgroup(monkeypatch, tmp_path):
+    """Point telemetry at fake cgroup files laid out as v2 or v1."""
+
+    def _install(layout: str, limit: str, usage: int, stat: str) -> None:
+        names = {
+            "v2": ("memory.max", "memory.current", "memory.stat"),
+            "v1": ("memory.limit_in_bytes", "memory.usage_in_bytes", "memory.stat"),
+        }[layout]
+        paths = tuple(str(tmp_path / name) for name in names)
+        for path, content in zip(paths, (f"{limit}\n", f"{usage}\n", stat)):
+            Path(path).write_text(content)
+
+        monkeypatch.setattr(telemetry, "_MEMORY_CGROUP_PATHS", paths)
+        monkeypatch.setattr(
+            telemetry, "_INACTIVE_FILE_KEY", b"inactive_file" if layout == "v2" else b"total_inactive_file"
+        )
+
+    _reset()
+    yield _install
+    _reset()
+
+
+def _reset() -> None:
+    telemetry._memory_limit_bytes.cache_clear()
+    for fd in telemetry._open_fds.values():
+        os.close(fd)
+    telemetry._open_fds.clear()
+
+
+def test_v2_available_excludes_reclaimable_page_cache(cgroup) -> None:
+    cgroup("v2", str(8 * _GB), 5 * _GB, f"anon {3 * _GB}\ninactive_file {2 * _GB}\nactive_file 0\n")
+
+    info = telemetry.get_container_memory_info()
+
+    assert info["limit"] == 8
+    assert info["used"] == 5
+    assert info["available"] == 5
+
+
+def test_v2_inactive_file_on_first_line_is_found(cgroup) -> None:
+    cgroup("v2", str(4 * _GB), 3 * _GB, f"inactive_file {_GB}\nanon {2 * _GB}\n")
+
+    assert telemetry.get_container_memory_info()["available"] == 2
+
+
+def test_v2_unlimited_reports_no_limit(cgroup) -> None:
+    cgroup("v2", "max", 3 * _GB, f"inactive_file {_GB}\n")
+
+    info = telemetry.get_container_memory_info()
+
+    assert "limit" not in info
+    assert info["used"] == 3
+
+
+def test_v1_uses_hierarchical_inactive_file(cgroup) -> None:
+    stat = f"cache {_GB}\ninactive_file 0\ntotal_inactive_file {_GB}\n"
+    cgroup("v1", str(6 * _GB), 4 * _GB, stat)
+
+    info = telemetry.get_container_memory_info()
+
+    assert info["limit"] == 6
+    assert info["available"] == 3
+
+
+def test_v1_unlimited_sentinel_reports_no_limit(cgroup) -> None:
+    cgroup("v1", str(2**63 - 4096), 4 * _GB, f"total_inactive_file {_GB}\n")
+
+    info = telemetry.get_container_memory_info()
+
+    assert "limit" not in info
+    assert info["used"] == 4
@@ -1,13 +1,21 @@
 """Unit tests for workflow preparation utilities."""
 from __future__ import annotations
 
+import base64
 import json
+from io import BytesIO
+
+from PIL import Image
 
 from workflows import (
     create_unique_filename_prefix,
     load_workflow_template,
+    prepare_workflow,
     set_workflow_dimensions,
     substitute_workflow_placeholders,
+    upload_input_image,
+    workflow_placeholders,
+    workflow_requires_input_image,
 )
 
 
@@ -71,6 +79,40 @@ def test_load_workflow_template_disneyizt_t2i_substitutes_placeholders() -> None
     assert "hello" in payload
 
 
+def test_load_workflow_template_is_cached_and_not_mutated_by_prepare() -> None:
+    workflow = load_workflow_template("video_wan2_2_14B_i2v")
+    snapshot = json.dumps(workflow, sort_keys=True)
+
+    prepare_workflow(workflow, "hello", "image.png", 480, 640, 81, "job")
+
+    assert load_workflow_template("video_wan2_2_14B_i2v") is workflow
+    assert json.dumps(workflow, sort_keys=True) == snapshot
+
+
+def test_workflow_placeholders_matches_template_and_plain_dicts() -> None:
+    template = load_workflow_template("video_wan2_2_14B_i2v")
+    plain = json.loads(json.dumps(template))
+
+    assert workflow_placeholders(template) == workflow_placeholders(plain)
+    assert "{{ INPUT_IMAGE }}" in workflow_placeholders(template)
+    assert workflow_requires_input_image(template)
+    assert not workflow_requires_input_image({"1": {"inputs": {"image": "photo.png"}}})
+
+
+def test_workflow_placeholders_ignores_stale_entries_for_reused_ids(monkeypatch) -> None:
+    import workflows
+
+    stranger = {"1": {"inputs": {"image": "photo.png"}}}
+    monkeypatch.setitem(
+        workflows._TEMPLATE_PLACEHOLDERS,
+        id(stranger),
+        ({"evicted": "template"}, frozenset({"{{ INPUT_IMAGE }}"})),
+    )
+
+    assert workflow_placeholders(stranger) == frozenset()
+    assert not workflow_requires_input_image(stranger)
+
+
 def test_substitute_workflow_placeholders_replaces_video_tokens() -> None:
     template = {
         "1": {"inputs": {"video": "{{ INPUT_VIDEO }}" }},
@@ -116,3 +158,55 @@ def test_create_unique_filename_prefix_updates_vhs_video_combine() -> None:
     create_unique_filename_prefix(template)
     prefix = template["1"]["inputs"]["filename_prefix"]
     assert prefix.startswith("seedvr2_upscaled_")
+
+
+class _RecordingClient:
+    def __init__(self) -> None:
+        self.uploads = []
+
+    def upload_image(self, filename: str, data: bytes, mime_type: str = "image/png") -> None:
+        self.uploads.append((filename, data, mime_type))
+
+
+def _encode_image(mode: str, size: tuple, image_format: str) -> bytes:
+    buffer = BytesIO()
+    Image.new(mode, size).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def test_upload_input_image_passes_matching_rgb_files_through() -> None:
+    original = _encode_image("RGB", (480, 640), "JPEG")
+    client = _RecordingClient()
+
+    filename = upload_input_image(base64.b64encode(original).decode(), "job", 480, 640, client)
+
+    assert filename.endswith(".jpg")
+    assert client.uploads == [(filename, original, "image/jpeg")]
+
+
+def test_upload_input_image_reencodes_animated_images_as_single_frame_png() -> None:
+    buffer = BytesIO()
+    frames = [Image.new("RGB", (480, 640), color) for color in ((255, 0, 0), (0, 0, 255))]
+    frames[0].save(buffer, format="WEBP", save_all=True, append_images=frames[1:])
+    client = _RecordingClient()
+
+    filename = upload_input_image(base64.b64encode(buffer.getvalue()).decode(), "job", 480, 640, client)
+
+    (_, data, mime_type), = client.uploads
+    uploaded = Image.open(BytesIO(data))
+    assert filename.endswith(".png")
+    assert mime_type == "image/png"
+    assert uploaded.format == "PNG"
+    assert getattr(uploaded, "n_frames", 1) == 1
+
+
+def test_upload_input_image_reencodes_images_that_need_conversion() -> None:
+    original = _encode_image("RGBA", (480, 640), "PNG")
+    client = _RecordingClient()
+
+    filename = upload_input_image(base64.b64encode(original).decode(), "job", 480, 640, client)
+
+    (_, data, mime_type), = client.uploads
+    assert filename.endswith(".png")
+    assert mime_type == "image/png"
+    assert Image.open(BytesIO(data)).mode == "RGB"